@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import User, Project, Environment, Config, Secret, ProjectUser, AllowedIP, APIToken
+from app.utils.upsert import insert_ignore
 import os
 import sys
 
@@ -18,20 +19,20 @@ def create_admin():
         email = input("Admin email: ")
         password = input("Admin password: ")
         
-        existing_user = User.query.filter(
-            (User.username == username) | (User.email == email)
-        ).first()
+        # Single INSERT that skips rows clashing with an existing username/email
+        created = insert_ignore(
+            User,
+            username=username,
+            email=email,
+            password_hash=User.hash_password(password),
+            is_admin=True
+        )
+        db.session.commit()
         
-        if existing_user:
+        if not created:
             print("User already exists!")
             return
         
-        admin_user = User(username=username, email=email, is_admin=True)
-        admin_user.set_password(password)
-        
-        db.session.add(admin_user)
-        db.session.commit()
-        
         print(f"Admin user '{username}' created successfully!")
 
 if __name__ == '__main__':
@@ -48,7 +49,7 @@ if __name__ == '__main__':
             print("  python app.py create-admin - Create an admin user")
             print("  python app.py             - Start the web server")
     else:
-        # Start the web server
+        # Start the development server (use gunicorn -c gunicorn.conf.py 'app:create_app()' in production)
         port = int(os.environ.get('PORT', 5000))
         debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
         app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
@@ -1,15 +1,21 @@
+import re
 from flask import Flask, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_cors import CORS
 from config import Config
+from app.utils.json_provider import ORJSONProvider
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 
+# Matches /api/<endpoint>/<project_id>/<environment_name>
+_API_PATH_RE = re.compile(r'/api/\w+/(\d+)/(\w+)')
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.json = ORJSONProvider(app)
     
     # Configure CORS to handle all requests
     CORS(app, origins=[], supports_credentials=True)
@@ -18,11 +24,11 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     
-    from app.models import User
+    from app.utils.user_cache import load_cached_user
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_cached_user(user_id)
     
     from app.routes.auth import auth_bp
     from app.routes.projects import projects_bp
@@ -34,42 +40,47 @@ def create_app():
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(main_bp)
     
+    # Compile every template at startup so the first request doesn't pay the parse cost
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+    
+    # Imported after blueprints to avoid circular imports
+    from app.utils.security import check_origin_whitelist
+    from app.utils.token_cache import get_token
+    
     # Custom CORS handling for API endpoints with whitelist validation
     @app.after_request
     def after_request(response):
         origin = request.headers.get('Origin')
         
         # Only handle CORS for API endpoints
-        if origin and request.endpoint and request.endpoint.startswith('api.'):
-            # Import here to avoid circular imports
-            from app.utils.security import check_origin_whitelist
-            from app.models import APIToken
-            import re
-            
-            # Extract project_id and environment from the API endpoint
-            project_id = None
-            environment_id = None
-            
-            # Try to get project_id from URL path
-            path_match = re.search(r'/api/\w+/(\d+)/(\w+)', request.path)
-            if path_match:
-                project_id = int(path_match.group(1))
-                environment_name = path_match.group(2)
-                
-                # Get environment_id from API token if available
-                auth_header = request.headers.get('Authorization')
-                if auth_header and auth_header.startswith('Bearer '):
-                    token = auth_header.split(' ')[1]
-                    api_token = APIToken.query.filter_by(token=token, is_active=True).first()
-                    if api_token:
-                        environment_id = api_token.environment_id
+        if not origin or request.blueprint != 'api':
+            return response
+        
+        # Extract project_id and environment from the API endpoint
+        project_id = None
+        environment_id = None
+        
+        # Try to get project_id from URL path
+        path_match = _API_PATH_RE.search(request.path)
+        if path_match:
+            project_id = int(path_match.group(1))
+            environment_name = path_match.group(2)
             
-            # Check if origin is whitelisted for this project/environment
-            if project_id and check_origin_whitelist(origin, project_id, environment_id):
-                response.headers['Access-Control-Allow-Origin'] = origin
-                response.headers['Access-Control-Allow-Headers'] = 'Authorization, Content-Type'
-                response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-                response.headers['Access-Control-Allow-Credentials'] = 'true'
+            # Get environment_id from API token if available
+            auth_header = request.headers.get('Authorization')
+            if auth_header and auth_header.startswith('Bearer '):
+                token = auth_header.split(' ')[1]
+                api_token = get_token(token)
+                if api_token:
+                    environment_id = api_token.environment_id
+        
+        # Check if origin is whitelisted for this project/environment
+        if project_id and check_origin_whitelist(origin, project_id, environment_id):
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Access-Control-Allow-Headers'] = 'Authorization, Content-Type'
+            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+            response.headers['Access-Control-Allow-Credentials'] = 'true'
         
         return response
     
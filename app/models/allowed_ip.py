@@ -11,4 +11,6 @@ class AllowedIP(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     project = db.relationship('Project', back_populates='allowed_ips')
-    environment = db.relationship('Environment', overlaps="allowed_ips")
\ No newline at end of file
+    environment = db.relationship('Environment', overlaps="allowed_ips")
+    
+    __table_args__ = (db.Index('ix_allowedip_project_env', 'project_id', 'environment_id'),)
\ No newline at end of file
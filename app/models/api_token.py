@@ -3,7 +3,7 @@ from app import db
 
 class APIToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.String(255), unique=True, nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, index=True, nullable=False)  # SHA-256 of the bearer token
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     environment_id = db.Column(db.Integer, db.ForeignKey('environment.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -12,4 +12,12 @@ class APIToken(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     
     project = db.relationship('Project')
-    environment = db.relationship('Environment')
\ No newline at end of file
+    environment = db.relationship('Environment', back_populates='api_tokens')
+    
+    __table_args__ = (
+        db.Index('ix_apitoken_project_env_active', 'project_id', 'environment_id', 'is_active'),
+        # Partial index over active tokens only, used by the bearer token lookup
+        db.Index('ix_active_token_hash', 'token_hash',
+                 postgresql_where=db.text('is_active'),
+                 sqlite_where=db.text('is_active')),
+    )
\ No newline at end of file
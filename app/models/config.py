@@ -1,5 +1,6 @@
 from datetime import datetime
 from app import db
+from app.utils.timestamps import PreciseDateTime, utcnow
 
 class Config(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -7,8 +8,8 @@ class Config(db.Model):
     value = db.Column(db.Text, nullable=False)
     environment_id = db.Column(db.Integer, db.ForeignKey('environment.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(PreciseDateTime, server_default=utcnow(), onupdate=utcnow())  # Stamped by the database
     
     environment = db.relationship('Environment', back_populates='configs')
     
-    __table_args__ = (db.UniqueConstraint('key', 'environment_id', name='unique_config_per_env'),)
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('environment_id', 'key', name='unique_config_per_env'),)
\ No newline at end of file
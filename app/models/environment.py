@@ -12,5 +12,6 @@ class Environment(db.Model):
     configs = db.relationship('Config', back_populates='environment', cascade='all, delete-orphan')
     secrets = db.relationship('Secret', back_populates='environment', cascade='all, delete-orphan')
     allowed_ips = db.relationship('AllowedIP', cascade='all, delete-orphan')
+    api_tokens = db.relationship('APIToken', back_populates='environment', cascade='all, delete-orphan')
     
-    __table_args__ = (db.UniqueConstraint('name', 'project_id', name='unique_env_per_project'),)
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('project_id', 'name', name='unique_env_per_project'),)
\ No newline at end of file
@@ -11,4 +11,8 @@ class ProjectUser(db.Model):
     user = db.relationship('User', back_populates='project_users')
     project = db.relationship('Project', back_populates='project_users')
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'project_id', name='unique_user_per_project'),)
\ No newline at end of file
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'project_id', name='unique_user_per_project'),
+        # Owner lookups by project (last-owner guards, sole-owner checks)
+        db.Index('ix_projectuser_project_role', 'project_id', 'role'),
+    )
\ No newline at end of file
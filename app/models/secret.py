@@ -1,5 +1,6 @@
 from datetime import datetime
 from app import db
+from app.utils.timestamps import PreciseDateTime, utcnow
 
 class Secret(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -7,8 +8,8 @@ class Secret(db.Model):
     encrypted_value = db.Column(db.Text, nullable=False)  # Encrypted secret value
     environment_id = db.Column(db.Integer, db.ForeignKey('environment.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(PreciseDateTime, server_default=utcnow(), onupdate=utcnow())  # Stamped by the database
     
     environment = db.relationship('Environment', back_populates='secrets')
     
-    __table_args__ = (db.UniqueConstraint('key', 'environment_id', name='unique_secret_per_env'),)
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('environment_id', 'key', name='unique_secret_per_env'),)
\ No newline at end of file
@@ -1,8 +1,13 @@
 from datetime import datetime
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from app import db
 
+# argon2id; verification is memory-hard rather than a long PBKDF2 CPU loop
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2)
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -13,8 +18,27 @@ class User(UserMixin, db.Model):
     
     project_users = db.relationship('ProjectUser', back_populates='user', cascade='all, delete-orphan')
     
+    @staticmethod
+    def hash_password(password):
+        return _password_hasher.hash(password)
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = User.hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        """Verify a password, upgrading legacy or outdated hashes in place (caller commits)."""
+        if not self.password_hash.startswith('$argon2'):
+            # Hashes created before argon2 was adopted (werkzeug PBKDF2/scrypt)
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        
+        try:
+            _password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        
+        if _password_hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
\ No newline at end of file
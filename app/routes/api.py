@@ -2,8 +2,14 @@ from flask import Blueprint, request, jsonify, g
 from flask_login import login_required
 from app import db
 from app.models import Project, Environment, Config, Secret, APIToken
-from app.utils.encryption import EncryptionManager
+from app.utils.encryption import EncryptionManager, encryption_manager
+from app.utils.errors import error_response
 from app.utils.security import require_api_token, require_project_permission, require_project_permission_with_ip
+from app.utils.token_cache import invalidate_token
+from app.utils.response_cache import cached_response, invalidate_environment_cache
+from app.utils.rate_limit import rate_limit
+from app.utils.timestamps import utcnow
+from app.utils.upsert import upsert
 from datetime import datetime, timedelta
 import secrets
 
@@ -12,24 +18,30 @@ api_bp = Blueprint('api', __name__)
 # READ-ONLY API endpoints for applications
 @api_bp.route('/config/<int:project_id>/<environment_name>')
 @require_api_token()
+@rate_limit()
+@cached_response('config')
 def get_config(project_id, environment_name):
     """Get all configs for a specific project and environment."""
     if g.api_token.project_id != project_id:
-        return jsonify({'error': 'Token not valid for this project'}), 403
-    
-    environment = Environment.query.filter_by(
-        project_id=project_id,
-        name=environment_name
+        return error_response('Token not valid for this project', 403)
+    
+    # Matching on the token's environment id folds the access check into the lookup
+    environment = db.session.execute(
+        db.select(Environment.id).where(
+            Environment.id == g.api_token.environment_id,
+            Environment.project_id == project_id,
+            Environment.name == environment_name
+        )
     ).first()
     
-    if not environment or g.api_token.environment_id != environment.id:
-        return jsonify({'error': 'Environment not found or not accessible'}), 404
-    
-    configs = Config.query.filter_by(environment_id=environment.id).all()
+    if not environment:
+        return error_response('Environment not found or not accessible', 404)
     
-    config_data = {}
-    for config in configs:
-        config_data[config.key] = config.value
+    # Select only the columns we need; skips ORM object construction
+    rows = db.session.execute(
+        db.select(Config.key, Config.value).where(Config.environment_id == environment.id)
+    ).all()
+    config_data = dict(rows)
     
     return jsonify({
         'project_id': project_id,
@@ -39,24 +51,30 @@ def get_config(project_id, environment_name):
 
 @api_bp.route('/secrets/<int:project_id>/<environment_name>')
 @require_api_token()
+@rate_limit()
+@cached_response('secrets', store=False)
 def get_secrets(project_id, environment_name):
     """Get all encrypted secrets for a specific project and environment."""
     if g.api_token.project_id != project_id:
-        return jsonify({'error': 'Token not valid for this project'}), 403
-    
-    environment = Environment.query.filter_by(
-        project_id=project_id,
-        name=environment_name
+        return error_response('Token not valid for this project', 403)
+    
+    # Matching on the token's environment id folds the access check into the lookup
+    environment = db.session.execute(
+        db.select(Environment.id, Environment.secret_key).where(
+            Environment.id == g.api_token.environment_id,
+            Environment.project_id == project_id,
+            Environment.name == environment_name
+        )
     ).first()
     
-    if not environment or g.api_token.environment_id != environment.id:
-        return jsonify({'error': 'Environment not found or not accessible'}), 404
-    
-    secrets_query = Secret.query.filter_by(environment_id=environment.id).all()
+    if not environment:
+        return error_response('Environment not found or not accessible', 404)
     
-    secret_data = {}
-    for secret in secrets_query:
-        secret_data[secret.key] = secret.encrypted_value
+    rows = db.session.execute(
+        db.select(Secret.key, Secret.encrypted_value).where(Secret.environment_id == environment.id)
+    ).all()
+    # Clients expect each Fernet token wrapped in base64, as secrets were originally stored
+    secret_data = {key: EncryptionManager.client_format(encrypted_value) for key, encrypted_value in rows}
     
     return jsonify({
         'project_id': project_id,
@@ -67,36 +85,46 @@ def get_secrets(project_id, environment_name):
 
 @api_bp.route('/all/<int:project_id>/<environment_name>')
 @require_api_token()
+@rate_limit()
+@cached_response('all', store=False)
 def get_all(project_id, environment_name):
     """Get both configs and secrets for a specific project and environment."""
     if g.api_token.project_id != project_id:
-        return jsonify({'error': 'Token not valid for this project'}), 403
-    
-    environment = Environment.query.filter_by(
-        project_id=project_id,
-        name=environment_name
+        return error_response('Token not valid for this project', 403)
+    
+    # Matching on the token's environment id folds the access check into the lookup
+    environment = db.session.execute(
+        db.select(Environment.id, Environment.secret_key).where(
+            Environment.id == g.api_token.environment_id,
+            Environment.project_id == project_id,
+            Environment.name == environment_name
+        )
     ).first()
     
-    if not environment or g.api_token.environment_id != environment.id:
-        return jsonify({'error': 'Environment not found or not accessible'}), 404
+    if not environment:
+        return error_response('Environment not found or not accessible', 404)
     
-    configs = Config.query.filter_by(environment_id=environment.id).all()
-    secrets_query = Secret.query.filter_by(environment_id=environment.id).all()
+    # Fetch configs and secrets in one round trip, tagged by source table
+    rows = db.session.execute(
+        db.union_all(
+            db.select(db.literal(False).label('is_secret'), Config.key, Config.value)
+            .where(Config.environment_id == environment.id),
+            db.select(db.literal(True), Secret.key, Secret.encrypted_value)
+            .where(Secret.environment_id == environment.id)
+        )
+    ).all()
     
-    config_data = {}
-    for config in configs:
-        config_data[config.key] = config.value
+    config_data = {key: value for is_secret, key, value in rows if not is_secret}
+    secret_rows = [(key, value) for is_secret, key, value in rows if is_secret]
     
     secret_data = {}
-    encryption_manager = EncryptionManager()
-    for secret in secrets_query:
+    for key, encrypted_value in secret_rows:
         try:
             # Decrypt the secret for the client since JavaScript Fernet is complex
-            decrypted_value = encryption_manager.decrypt_value(secret.encrypted_value, environment.secret_key)
-            secret_data[secret.key] = decrypted_value
+            secret_data[key] = encryption_manager.decrypt_value(encrypted_value, environment.secret_key)
         except Exception as e:
             # If decryption fails, still include the key but with an error indication
-            secret_data[secret.key] = f"[DECRYPTION_ERROR: {str(e)}]"
+            secret_data[key] = f"[DECRYPTION_ERROR: {str(e)}]"
     
     return jsonify({
         'project_id': project_id,
@@ -115,19 +143,16 @@ def create_api_token(project_id, environment_id):
     data = request.get_json()
     token_name = data.get('name') if data else 'API Token'
     
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first()
+    environment = db.session.get(Environment, environment_id)
     
-    if not environment:
-        return jsonify({'error': 'Environment not found'}), 404
+    if not environment or environment.project_id != project_id:
+        return error_response('Environment not found', 404)
     
     token = EncryptionManager.generate_api_token()
     expires_at = datetime.utcnow() + timedelta(days=365)  # 1 year expiry
     
     api_token = APIToken(
-        token=token,
+        token_hash=EncryptionManager.hash_api_token(token),
         project_id=project_id,
         environment_id=environment_id,
         name=token_name,
@@ -149,13 +174,10 @@ def create_api_token(project_id, environment_id):
 @require_project_permission('owner')
 def revoke_api_token(project_id, environment_id, token_id):
     """Revoke (delete) an API token."""
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first()
+    environment = db.session.get(Environment, environment_id)
     
-    if not environment:
-        return jsonify({'error': 'Environment not found'}), 404
+    if not environment or environment.project_id != project_id:
+        return error_response('Environment not found', 404)
     
     api_token = APIToken.query.filter_by(
         id=token_id,
@@ -164,10 +186,12 @@ def revoke_api_token(project_id, environment_id, token_id):
     ).first()
     
     if not api_token:
-        return jsonify({'error': 'API token not found'}), 404
+        return error_response('API token not found', 404)
     
+    token_hash = api_token.token_hash
     db.session.delete(api_token)
     db.session.commit()
+    invalidate_token(token_hash)
     
     return jsonify({'message': 'API token revoked successfully'})
 
@@ -176,13 +200,10 @@ def revoke_api_token(project_id, environment_id, token_id):
 @require_project_permission('owner')
 def toggle_api_token(project_id, environment_id, token_id):
     """Toggle API token active status."""
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first()
+    environment = db.session.get(Environment, environment_id)
     
-    if not environment:
-        return jsonify({'error': 'Environment not found'}), 404
+    if not environment or environment.project_id != project_id:
+        return error_response('Environment not found', 404)
     
     api_token = APIToken.query.filter_by(
         id=token_id,
@@ -191,10 +212,11 @@ def toggle_api_token(project_id, environment_id, token_id):
     ).first()
     
     if not api_token:
-        return jsonify({'error': 'API token not found'}), 404
+        return error_response('API token not found', 404)
     
     api_token.is_active = not api_token.is_active
     db.session.commit()
+    invalidate_token(api_token.token_hash)
     
     status = 'activated' if api_token.is_active else 'deactivated'
     return jsonify({'message': f'API token {status} successfully', 'is_active': api_token.is_active})
@@ -208,7 +230,7 @@ def manage_config(project_id, environment_name):
     data = request.get_json()
     
     if not data:
-        return jsonify({'error': 'No data provided'}), 400
+        return error_response('No data provided', 400)
     
     environment = Environment.query.filter_by(
         project_id=project_id,
@@ -216,7 +238,7 @@ def manage_config(project_id, environment_name):
     ).first()
     
     if not environment:
-        return jsonify({'error': 'Environment not found'}), 404
+        return error_response('Environment not found', 404)
     
     # Handle both individual key-value pairs and bulk configs/secrets
     if 'key' in data and 'value' in data:
@@ -229,55 +251,26 @@ def manage_config(project_id, environment_name):
         secrets = data.get('secrets', {})
     
     try:
-        # Handle configs
-        for key, value in configs.items():
-            existing_config = Config.query.filter_by(
-                environment_id=environment.id,
-                key=key
-            ).first()
-            
-            if existing_config:
-                existing_config.value = value
-            else:
-                new_config = Config(
-                    environment_id=environment.id,
-                    key=key,
-                    value=value
-                )
-                db.session.add(new_config)
+        # Handle configs: one INSERT ... ON CONFLICT for all keys
+        upsert(Config, [
+            {'environment_id': environment.id, 'key': key, 'value': value}
+            for key, value in configs.items()
+        ], ['environment_id', 'key'], ['value'], updated_at=utcnow())
         
         # Handle secrets
-        encryption_manager = EncryptionManager()
-        for key, value in secrets.items():
-            existing_secret = Secret.query.filter_by(
-                environment_id=environment.id,
-                key=key
-            ).first()
-            
-            encrypted_value = encryption_manager.encrypt_value(value, environment.secret_key)
-            
-            if existing_secret:
-                existing_secret.encrypted_value = encrypted_value
-            else:
-                new_secret = Secret(
-                    environment_id=environment.id,
-                    key=key,
-                    encrypted_value=encrypted_value
-                )
-                db.session.add(new_secret)
+        encrypted_values = encryption_manager.encrypt_many(secrets.values(), environment.secret_key)
+        upsert(Secret, [
+            {'environment_id': environment.id, 'key': key, 'encrypted_value': encrypted_value}
+            for key, encrypted_value in zip(secrets, encrypted_values)
+        ], ['environment_id', 'key'], ['encrypted_value'], updated_at=utcnow())
         
         db.session.commit()
-        
-        # Verify data was saved
-        saved_configs = Config.query.filter_by(environment_id=environment.id).count()
-        saved_secrets = Secret.query.filter_by(environment_id=environment.id).count()
+        invalidate_environment_cache(environment)
         
         return jsonify({
             'message': 'Configuration saved successfully',
             'configs_updated': len(configs),
-            'secrets_updated': len(secrets),
-            'total_configs': saved_configs,
-            'total_secrets': saved_secrets
+            'secrets_updated': len(secrets)
         })
     
     except Exception as e:
@@ -295,29 +288,18 @@ def delete_config_key(project_id, environment_name, key):
     ).first()
     
     if not environment:
-        return jsonify({'error': 'Environment not found'}), 404
+        return error_response('Environment not found', 404)
     
-    # Try to find and delete config
-    config = Config.query.filter_by(
-        environment_id=environment.id,
-        key=key
-    ).first()
-    
-    if config:
-        db.session.delete(config)
-        db.session.commit()
-        return jsonify({'message': f'Config key "{key}" deleted successfully'})
-    
-    # Try to find and delete secret
-    secret = Secret.query.filter_by(
-        environment_id=environment.id,
-        key=key
-    ).first()
-    
-    if secret:
-        db.session.delete(secret)
-        db.session.commit()
-        return jsonify({'message': f'Secret key "{key}" deleted successfully'})
+    # Try to delete a config, then a secret; rowcount tells us which one existed
+    for model, label in ((Config, 'Config'), (Secret, 'Secret')):
+        deleted = db.session.execute(
+            db.delete(model).where(model.environment_id == environment.id, model.key == key)
+        ).rowcount
+        
+        if deleted:
+            db.session.commit()
+            invalidate_environment_cache(environment)
+            return jsonify({'message': f'{label} key "{key}" deleted successfully'})
     
     return jsonify({'error': f'Key "{key}" not found'}), 404
 
@@ -331,7 +313,7 @@ def manage_secret(project_id, environment_name):
     data = request.get_json()
     
     if not data:
-        return jsonify({'error': 'No data provided'}), 400
+        return error_response('No data provided', 400)
     
     environment = Environment.query.filter_by(
         project_id=project_id,
@@ -339,7 +321,7 @@ def manage_secret(project_id, environment_name):
     ).first()
     
     if not environment:
-        return jsonify({'error': 'Environment not found'}), 404
+        return error_response('Environment not found', 404)
     
     # Handle individual key-value pairs for secrets
     if 'key' in data and 'value' in data:
@@ -350,35 +332,19 @@ def manage_secret(project_id, environment_name):
         secrets = data.get('secrets', {})
     
     try:
-        # Handle secrets
-        encryption_manager = EncryptionManager()
-        for key, value in secrets.items():
-            existing_secret = Secret.query.filter_by(
-                environment_id=environment.id,
-                key=key
-            ).first()
-            
-            encrypted_value = encryption_manager.encrypt_value(value, environment.secret_key)
-            
-            if existing_secret:
-                existing_secret.encrypted_value = encrypted_value
-            else:
-                new_secret = Secret(
-                    environment_id=environment.id,
-                    key=key,
-                    encrypted_value=encrypted_value
-                )
-                db.session.add(new_secret)
+        # Handle secrets: one INSERT ... ON CONFLICT for all keys
+        encrypted_values = encryption_manager.encrypt_many(secrets.values(), environment.secret_key)
+        upsert(Secret, [
+            {'environment_id': environment.id, 'key': key, 'encrypted_value': encrypted_value}
+            for key, encrypted_value in zip(secrets, encrypted_values)
+        ], ['environment_id', 'key'], ['encrypted_value'], updated_at=utcnow())
         
         db.session.commit()
-        
-        # Verify data was saved
-        saved_secrets = Secret.query.filter_by(environment_id=environment.id).count()
+        invalidate_environment_cache(environment)
         
         return jsonify({
             'message': 'Secrets saved successfully',
-            'secrets_updated': len(secrets),
-            'total_secrets': saved_secrets
+            'secrets_updated': len(secrets)
         })
     
     except Exception as e:
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models import User
+from app.utils.user_cache import invalidate_user
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -21,6 +22,9 @@ def login():
         user = User.query.filter_by(username=username).first()
         
         if user and user.check_password(password):
+            # check_password may have upgraded the stored hash
+            if db.session.is_modified(user):
+                db.session.commit()
             login_user(user)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
@@ -92,16 +96,19 @@ def profile():
         new_password = request.form.get('new_password')
         confirm_password = request.form.get('confirm_password')
         
-        if email != current_user.email:
+        # current_user may be a cached copy; edit the database row
+        user = db.session.get(User, current_user.id)
+        
+        if email != user.email:
             # Check if email is already taken
             existing_user = User.query.filter_by(email=email).first()
             if existing_user:
                 flash('Email already exists', 'error')
                 return render_template('auth/profile.html')
-            current_user.email = email
+            user.email = email
         
         if new_password:
-            if not current_password or not current_user.check_password(current_password):
+            if not current_password or not user.check_password(current_password):
                 flash('Current password is incorrect', 'error')
                 return render_template('auth/profile.html')
             
@@ -113,9 +120,11 @@ def profile():
                 flash('Password must be at least 8 characters long', 'error')
                 return render_template('auth/profile.html')
             
-            current_user.set_password(new_password)
+            user.set_password(new_password)
         
         db.session.commit()
+        invalidate_user(user.id)
         flash('Profile updated successfully', 'success')
+        return redirect(url_for('auth.profile'))
     
     return render_template('auth/profile.html')
\ No newline at end of file
@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app.models import Project, ProjectUser, User
 from app import db
+from app.utils.user_cache import invalidate_user
+from app.utils.loading import eager_options
 
 main_bp = Blueprint('main', __name__)
 
@@ -17,7 +20,9 @@ def dashboard():
     if current_user.is_admin:
         projects = Project.query.all()
     else:
-        project_users = ProjectUser.query.filter_by(user_id=current_user.id).all()
+        project_users = ProjectUser.query.options(*eager_options(
+            joinedload(ProjectUser.project)
+        )).filter_by(user_id=current_user.id).all()
         projects = [pu.project for pu in project_users]
     
     return render_template('dashboard.html', projects=projects)
@@ -29,18 +34,22 @@ def admin_users():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    users = User.query.all()
+    # Get user statistics in one aggregate query instead of two counts per user
+    rows = db.session.execute(
+        db.select(
+            User,
+            db.func.count(ProjectUser.id),
+            db.func.coalesce(db.func.sum(db.case((ProjectUser.role == 'owner', 1), else_=0)), 0)
+        )
+        .outerjoin(ProjectUser, ProjectUser.user_id == User.id)
+        .group_by(User.id)
+        .order_by(User.id)
+    ).all()
     
-    # Get user statistics
-    user_stats = []
-    for user in users:
-        project_count = ProjectUser.query.filter_by(user_id=user.id).count()
-        owned_projects = ProjectUser.query.filter_by(user_id=user.id, role='owner').count()
-        user_stats.append({
-            'user': user,
-            'project_count': project_count,
-            'owned_projects': owned_projects
-        })
+    user_stats = [
+        {'user': user, 'project_count': project_count, 'owned_projects': owned_projects}
+        for user, project_count, owned_projects in rows
+    ]
     
     return render_template('admin/users.html', user_stats=user_stats)
 
@@ -58,6 +67,7 @@ def toggle_admin(user_id):
     user = User.query.get_or_404(user_id)
     user.is_admin = not user.is_admin
     db.session.commit()
+    invalidate_user(user.id)
     
     status = 'granted' if user.is_admin else 'revoked'
     flash(f"Admin privileges {status} for user '{user.username}'", 'success')
@@ -77,16 +87,17 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     
     # Check if user is the sole owner of any projects
-    sole_owner_projects = []
-    owned_projects = ProjectUser.query.filter_by(user_id=user_id, role='owner').all()
-    
-    for project_user in owned_projects:
-        owner_count = ProjectUser.query.filter_by(
-            project_id=project_user.project_id,
-            role='owner'
-        ).count()
-        if owner_count == 1:
-            sole_owner_projects.append(project_user.project.name)
+    owned_project_ids = db.select(ProjectUser.project_id).where(
+        ProjectUser.user_id == user_id,
+        ProjectUser.role == 'owner'
+    )
+    sole_owner_projects = db.session.execute(
+        db.select(Project.name)
+        .join(ProjectUser, ProjectUser.project_id == Project.id)
+        .where(ProjectUser.role == 'owner', Project.id.in_(owned_project_ids))
+        .group_by(Project.id, Project.name)
+        .having(db.func.count(ProjectUser.id) == 1)
+    ).scalars().all()
     
     if sole_owner_projects:
         flash(f"Cannot delete user. They are the sole owner of: {', '.join(sole_owner_projects)}", 'error')
@@ -95,6 +106,7 @@ def delete_user(user_id):
     username = user.username
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
     
     flash(f"User '{username}' has been deleted", 'success')
     return redirect(url_for('main.admin_users'))
\ No newline at end of file
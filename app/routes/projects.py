@@ -1,23 +1,53 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, abort, g, current_app
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from app import db
 from app.models import Project, Environment, ProjectUser, User, Config, Secret, AllowedIP, APIToken
 from app.utils.encryption import EncryptionManager
 from app.utils.security import require_project_permission
 from app.utils.backup import BackupManager
+from app.utils.response_cache import invalidate_environment_cache
+from app.utils.whitelist_cache import invalidate_whitelist
+from app.utils.validation import validate_ip_or_host
+from app.utils.loading import eager_options
+from app.utils.timestamps import utcnow
+from app.utils.upsert import insert_ignore, upsert
 from datetime import datetime
-import io
+import tempfile
 
 projects_bp = Blueprint('projects', __name__)
 
+# Backups larger than this are spooled to a temporary file instead of memory
+BACKUP_SPOOL_SIZE = 16 * 1024 * 1024
+
+def _has_other_owner(project_id, user_id):
+    """Check if the project has an owner other than the given user."""
+    return db.session.execute(
+        db.select(db.exists().where(
+            ProjectUser.project_id == project_id,
+            ProjectUser.role == 'owner',
+            ProjectUser.user_id != user_id
+        ))
+    ).scalar()
+
+def _form_error(message, endpoint, **values):
+    """Report a form validation error: JSON 400 for API clients, otherwise flash and redirect to the form."""
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        return jsonify({'error': message}), 400
+    flash(message, 'error')
+    return redirect(url_for(endpoint, **values))
+
 @projects_bp.route('/')
 @login_required
 def list_projects():
     if current_user.is_admin:
         projects = Project.query.all()
     else:
-        project_users = ProjectUser.query.filter_by(user_id=current_user.id).all()
-        projects = [pu.project for pu in project_users]
+        # Load the user's projects with one JOIN instead of a lazy load per membership
+        projects = Project.query.join(
+            ProjectUser, ProjectUser.project_id == Project.id
+        ).filter(ProjectUser.user_id == current_user.id).all()
     
     return render_template('projects/list.html', projects=projects)
 
@@ -29,27 +59,22 @@ def create_project():
         description = request.form.get('description', '')
         
         if not name:
-            flash('Project name is required', 'error')
-            return render_template('projects/create.html')
-        
-        # Check if project name already exists
-        existing_project = Project.query.filter_by(name=name).first()
-        if existing_project:
-            flash('Project name already exists', 'error')
-            return render_template('projects/create.html')
+            return _form_error('Project name is required', 'projects.create_project')
         
-        project = Project(name=name, description=description)
+        # Add current user as owner through the relationship, so both rows go in one flush
+        project = Project(
+            name=name,
+            description=description,
+            project_users=[ProjectUser(user_id=current_user.id, role='owner')]
+        )
         db.session.add(project)
-        db.session.flush()  # Get the project ID
         
-        # Add current user as owner
-        project_user = ProjectUser(
-            user_id=current_user.id,
-            project_id=project.id,
-            role='owner'
-        )
-        db.session.add(project_user)
-        db.session.commit()
+        try:
+            # The unique name constraint rejects duplicates; no pre-check query needed
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return _form_error('Project name already exists', 'projects.create_project')
         
         flash('Project created successfully', 'success')
         return redirect(url_for('projects.view_project', project_id=project.id))
@@ -60,7 +85,7 @@ def create_project():
 @login_required
 @require_project_permission('reader')
 def view_project(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = g.project
     environments = Environment.query.filter_by(project_id=project_id).all()
     
     return render_template('projects/view.html', project=project, environments=environments)
@@ -69,24 +94,13 @@ def view_project(project_id):
 @login_required
 @require_project_permission('owner')
 def create_environment(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = g.project
     
     if request.method == 'POST':
         name = request.form.get('name')
         
         if not name:
-            flash('Environment name is required', 'error')
-            return render_template('projects/create_environment.html', project=project)
-        
-        # Check if environment already exists in this project
-        existing_env = Environment.query.filter_by(
-            name=name,
-            project_id=project_id
-        ).first()
-        
-        if existing_env:
-            flash('Environment already exists in this project', 'error')
-            return render_template('projects/create_environment.html', project=project)
+            return _form_error('Environment name is required', 'projects.create_environment', project_id=project_id)
         
         # Generate encryption key for this environment
         secret_key = EncryptionManager.generate_key()
@@ -97,7 +111,13 @@ def create_environment(project_id):
             secret_key=secret_key
         )
         db.session.add(environment)
-        db.session.commit()
+        
+        try:
+            # The (project_id, name) unique constraint rejects duplicates; no pre-check query needed
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return _form_error('Environment already exists in this project', 'projects.create_environment', project_id=project_id)
         
         flash('Environment created successfully', 'success')
         return redirect(url_for('projects.view_project', project_id=project_id))
@@ -108,83 +128,76 @@ def create_environment(project_id):
 @login_required
 @require_project_permission('reader')
 def view_environment(project_id, environment_id):
-    project = Project.query.get_or_404(project_id)
-    environment = Environment.query.filter_by(
+    # Load the environment with its project, configs, secrets and active tokens in one batch
+    environment = Environment.query.options(*eager_options(
+        joinedload(Environment.project),
+        selectinload(Environment.configs),
+        selectinload(Environment.secrets),
+        selectinload(Environment.api_tokens.and_(APIToken.is_active == True))
+    )).filter_by(
         id=environment_id,
         project_id=project_id
     ).first_or_404()
     
-    configs = Config.query.filter_by(environment_id=environment_id).all()
-    secrets = Secret.query.filter_by(environment_id=environment_id).all()
-    api_tokens = APIToken.query.filter_by(
-        project_id=project_id,
-        environment_id=environment_id,
-        is_active=True
-    ).all()
-    
-    
-    # Get environment-specific allowed IPs (backward compatible)
-    environment_ips = []
-    try:
-        if hasattr(AllowedIP, 'environment_id'):
-            environment_ips = AllowedIP.query.filter_by(
-                project_id=project_id,
-                environment_id=environment_id
-            ).all()
-    except Exception:
-        # Column doesn't exist yet, skip environment-specific IPs
-        pass
-    
     return render_template('projects/environment.html', 
-                         project=project, 
+                         project=environment.project, 
                          environment=environment, 
-                         configs=configs, 
-                         secrets=secrets,
-                         api_tokens=api_tokens,
-                         environment_ips=environment_ips)
+                         configs=environment.configs, 
+                         secrets=environment.secrets,
+                         api_tokens=environment.api_tokens)
 
 @projects_bp.route('/<int:project_id>/users')
 @login_required
 @require_project_permission('owner')
 def manage_users(project_id):
-    project = Project.query.get_or_404(project_id)
-    project_users = ProjectUser.query.filter_by(project_id=project_id).all()
-    all_users = User.query.all()
+    project = g.project
+    project_users = ProjectUser.query.options(*eager_options(
+        selectinload(ProjectUser.user)
+    )).filter_by(project_id=project_id).all()
+    
+    # Only users not already in the project can be added
+    available_users = User.query.filter(
+        ~User.id.in_(db.select(ProjectUser.user_id).where(ProjectUser.project_id == project_id))
+    ).all()
     
     return render_template('projects/users.html', 
                          project=project, 
                          project_users=project_users,
-                         all_users=all_users)
+                         available_users=available_users)
 
 @projects_bp.route('/<int:project_id>/users/add', methods=['POST'])
 @login_required
 @require_project_permission('owner')
 def add_user(project_id):
-    user_id = request.form.get('user_id')
+    user_id = request.form.get('user_id', type=int)
     role = request.form.get('role', 'reader')
     
     if not user_id:
         flash('User is required', 'error')
         return redirect(url_for('projects.manage_users', project_id=project_id))
     
-    # Check if user is already in the project
-    existing = ProjectUser.query.filter_by(
-        user_id=user_id,
-        project_id=project_id
-    ).first()
+    # Check the user first: MySQL's INSERT IGNORE would also swallow the foreign key error
+    user_exists = db.session.execute(
+        db.select(db.exists().where(User.id == user_id))
+    ).scalar()
     
-    if existing:
-        flash('User is already in this project', 'error')
+    if not user_exists:
+        flash('User not found', 'error')
         return redirect(url_for('projects.manage_users', project_id=project_id))
     
-    project_user = ProjectUser(
+    # Insert the membership unless the user is already in the project
+    added = insert_ignore(
+        ProjectUser,
         user_id=user_id,
         project_id=project_id,
         role=role
     )
-    db.session.add(project_user)
     db.session.commit()
     
+    if not added:
+        flash('User is already in this project', 'error')
+        return redirect(url_for('projects.manage_users', project_id=project_id))
+    
     flash('User added to project successfully', 'success')
     return redirect(url_for('projects.manage_users', project_id=project_id))
 
@@ -192,23 +205,22 @@ def add_user(project_id):
 @login_required
 @require_project_permission('owner')
 def remove_user(project_id, user_id):
-    project_user = ProjectUser.query.filter_by(
-        user_id=user_id,
-        project_id=project_id
-    ).first_or_404()
-    
     # Prevent removing yourself if you're the only owner
-    if user_id == current_user.id:
-        owners = ProjectUser.query.filter_by(
-            project_id=project_id,
-            role='owner'
-        ).count()
-        
-        if owners <= 1:
-            flash('Cannot remove the last owner from the project', 'error')
-            return redirect(url_for('projects.manage_users', project_id=project_id))
+    if user_id == current_user.id and not _has_other_owner(project_id, current_user.id):
+        flash('Cannot remove the last owner from the project', 'error')
+        return redirect(url_for('projects.manage_users', project_id=project_id))
+    
+    # Delete in one statement; rowcount tells us whether the membership existed
+    deleted = db.session.execute(
+        db.delete(ProjectUser).where(
+            ProjectUser.user_id == user_id,
+            ProjectUser.project_id == project_id
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    
+    if not deleted:
+        abort(404)
     
-    db.session.delete(project_user)
     db.session.commit()
     
     flash('User removed from project', 'success')
@@ -229,13 +241,8 @@ def change_user_role(project_id, user_id):
         return redirect(url_for('projects.manage_users', project_id=project_id))
     
     # Prevent changing your own role if you're the only owner
-    if user_id == current_user.id and project_user.role == 'owner':
-        owners = ProjectUser.query.filter_by(
-            project_id=project_id,
-            role='owner'
-        ).count()
-        
-        if owners <= 1 and new_role != 'owner':
+    if user_id == current_user.id and project_user.role == 'owner' and new_role != 'owner':
+        if not _has_other_owner(project_id, current_user.id):
             flash('Cannot change role: You are the only owner of this project', 'error')
             return redirect(url_for('projects.manage_users', project_id=project_id))
     
@@ -252,7 +259,7 @@ def change_user_role(project_id, user_id):
 @login_required
 @require_project_permission('owner')
 def manage_security(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = g.project
     allowed_ips = AllowedIP.query.filter_by(project_id=project_id).all()
     
     return render_template('projects/security.html', 
@@ -267,65 +274,12 @@ def add_allowed_ip(project_id):
     description = request.form.get('description', '')
     
     if not ip_address:
-        flash('IP address is required', 'error')
-        return redirect(url_for('projects.manage_security', project_id=project_id))
-    
-    # Validate IP address or FQDN format (now supports IP:port format)
-    import ipaddress as ip_module
-    import socket
-    import re
+        return _form_error('IP address is required', 'projects.manage_security', project_id=project_id)
     
-    is_fqdn = False
-    
-    # Check if IP has port (e.g., 127.0.0.1:3000 or localhost:3000)
-    port_pattern = r'^(.+):(\d+)$'
-    port_match = re.match(port_pattern, ip_address)
-    
-    if port_match:
-        # Extract IP/hostname and port
-        host_part = port_match.group(1)
-        port_part = port_match.group(2)
-        
-        # Validate port number
-        try:
-            port_num = int(port_part)
-            if not (1 <= port_num <= 65535):
-                flash('Port number must be between 1 and 65535', 'error')
-                return redirect(url_for('projects.manage_security', project_id=project_id))
-        except ValueError:
-            flash('Invalid port number', 'error')
-            return redirect(url_for('projects.manage_security', project_id=project_id))
-        
-        # Validate the host part
-        try:
-            if '/' in host_part:
-                ip_module.ip_network(host_part, strict=False)
-            else:
-                ip_module.ip_address(host_part)
-        except ValueError:
-            # Check if it's a valid hostname
-            try:
-                socket.getaddrinfo(host_part, None)
-                is_fqdn = True
-            except socket.gaierror:
-                flash('Invalid IP address or hostname in IP:port format', 'error')
-                return redirect(url_for('projects.manage_security', project_id=project_id))
-    else:
-        # Original validation logic for IP/CIDR/FQDN without port
-        try:
-            # Try to validate as IP address or CIDR first
-            if '/' in ip_address:
-                ip_module.ip_network(ip_address, strict=False)
-            else:
-                ip_module.ip_address(ip_address)
-        except ValueError:
-            # If not a valid IP, check if it's a valid FQDN
-            try:
-                socket.getaddrinfo(ip_address, None)
-                is_fqdn = True
-            except socket.gaierror:
-                flash('Invalid IP address, CIDR, hostname, or IP:port format', 'error')
-                return redirect(url_for('projects.manage_security', project_id=project_id))
+    # Validate IP address or FQDN format (supports IP:port format)
+    ok, is_fqdn, error = validate_ip_or_host(ip_address)
+    if not ok:
+        return _form_error(error, 'projects.manage_security', project_id=project_id)
     
     allowed_ip = AllowedIP(
         ip_address=ip_address,
@@ -335,6 +289,7 @@ def add_allowed_ip(project_id):
     )
     db.session.add(allowed_ip)
     db.session.commit()
+    invalidate_whitelist(project_id)
     
     flash('IP address added successfully', 'success')
     return redirect(url_for('projects.manage_security', project_id=project_id))
@@ -343,13 +298,18 @@ def add_allowed_ip(project_id):
 @login_required
 @require_project_permission('owner')
 def remove_allowed_ip(project_id, ip_id):
-    allowed_ip = AllowedIP.query.filter_by(
-        id=ip_id,
-        project_id=project_id
-    ).first_or_404()
+    deleted = db.session.execute(
+        db.delete(AllowedIP).where(
+            AllowedIP.id == ip_id,
+            AllowedIP.project_id == project_id
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    
+    if not deleted:
+        abort(404)
     
-    db.session.delete(allowed_ip)
     db.session.commit()
+    invalidate_whitelist(project_id)
     
     flash('IP address removed', 'success')
     return redirect(url_for('projects.manage_security', project_id=project_id))
@@ -359,7 +319,7 @@ def remove_allowed_ip(project_id, ip_id):
 @require_project_permission('owner')
 def backup_project(project_id):
     """Display backup options for a project."""
-    project = Project.query.get_or_404(project_id)
+    project = g.project
     return render_template('projects/backup.html', project=project)
 
 @projects_bp.route('/<int:project_id>/backup/download', methods=['POST'])
@@ -367,7 +327,7 @@ def backup_project(project_id):
 @require_project_permission('owner')
 def download_backup(project_id):
     """Download an encrypted backup of the project."""
-    project = Project.query.get_or_404(project_id)
+    project = g.project
     
     password = request.form.get('password')
     include_users = request.form.get('include_users') == 'on'
@@ -377,14 +337,15 @@ def download_backup(project_id):
         return redirect(url_for('projects.backup_project', project_id=project_id))
     
     try:
-        backup_data = BackupManager.create_encrypted_backup(
+        # Write the ZIP into a spooled file: small backups stay in memory, large ones
+        # spill to disk, and send_file streams it out in chunks without another copy
+        backup_file = tempfile.SpooledTemporaryFile(max_size=BACKUP_SPOOL_SIZE)
+        BackupManager.create_encrypted_backup(
             project_id, 
             password, 
-            include_users
+            include_users,
+            fileobj=backup_file
         )
-        
-        # Create a file-like object for download
-        backup_file = io.BytesIO(backup_data)
         backup_file.seek(0)
         
         filename = f"{project.name}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
@@ -405,6 +366,12 @@ def download_backup(project_id):
 def restore_project():
     """Restore a project from backup."""
     if request.method == 'POST':
+        # Check the declared size before the multipart body is parsed
+        max_size = current_app.config.get('BACKUP_MAX_UPLOAD_SIZE')
+        if max_size and (request.content_length is None or request.content_length > max_size):
+            flash(f'Backup file is too large (limit {max_size // (1024 * 1024)} MB)', 'error')
+            return render_template('projects/restore.html'), 413
+        
         if 'backup_file' not in request.files:
             flash('No backup file selected', 'error')
             return render_template('projects/restore.html')
@@ -423,22 +390,14 @@ def restore_project():
             return render_template('projects/restore.html')
         
         try:
-            backup_data = file.read()
+            # Werkzeug already spools large uploads to disk; read the ZIP from that stream
             project = BackupManager.restore_encrypted_backup(
-                backup_data,
+                file.stream,
                 password,
                 new_project_name,
-                restore_users
-            )
-            
-            # Add current user as owner of restored project
-            project_user = ProjectUser(
-                user_id=current_user.id,
-                project_id=project.id,
-                role='owner'
+                restore_users,
+                owner_id=current_user.id  # Added in the same transaction as the restored data
             )
-            db.session.add(project_user)
-            db.session.commit()
             
             flash(f'Project "{project.name}" restored successfully!', 'success')
             return redirect(url_for('projects.view_project', project_id=project.id))
@@ -454,10 +413,9 @@ def restore_project():
 @require_project_permission('owner')
 def add_environment_ip(project_id, environment_id):
     """Add an IP to environment-specific whitelist."""
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first_or_404()
+    environment = db.session.get(Environment, environment_id)
+    if not environment or environment.project_id != project_id:
+        abort(404)
     
     ip_address = request.form.get('ip_address')
     description = request.form.get('description', '')
@@ -465,58 +423,10 @@ def add_environment_ip(project_id, environment_id):
     if not ip_address:
         return jsonify({'error': 'IP address is required'}), 400
     
-    # Validate IP address or FQDN format (now supports IP:port format)
-    import ipaddress as ip_module
-    import socket
-    import re
-    
-    is_fqdn = False
-    
-    # Check if IP has port (e.g., 127.0.0.1:3000 or localhost:3000)
-    port_pattern = r'^(.+):(\d+)$'
-    port_match = re.match(port_pattern, ip_address)
-    
-    if port_match:
-        # Extract IP/hostname and port
-        host_part = port_match.group(1)
-        port_part = port_match.group(2)
-        
-        # Validate port number
-        try:
-            port_num = int(port_part)
-            if not (1 <= port_num <= 65535):
-                return jsonify({'error': 'Port number must be between 1 and 65535'}), 400
-        except ValueError:
-            return jsonify({'error': 'Invalid port number'}), 400
-        
-        # Validate the host part
-        try:
-            if '/' in host_part:
-                ip_module.ip_network(host_part, strict=False)
-            else:
-                ip_module.ip_address(host_part)
-        except ValueError:
-            # Check if it's a valid hostname
-            try:
-                socket.getaddrinfo(host_part, None)
-                is_fqdn = True
-            except socket.gaierror:
-                return jsonify({'error': 'Invalid IP address or hostname in IP:port format'}), 400
-    else:
-        # Original validation logic for IP/CIDR/FQDN without port
-        try:
-            # Try to validate as IP address or CIDR first
-            if '/' in ip_address:
-                ip_module.ip_network(ip_address, strict=False)
-            else:
-                ip_module.ip_address(ip_address)
-        except ValueError:
-            # If not a valid IP, check if it's a valid FQDN
-            try:
-                socket.getaddrinfo(ip_address, None)
-                is_fqdn = True
-            except socket.gaierror:
-                return jsonify({'error': 'Invalid IP address, CIDR, hostname, or IP:port format'}), 400
+    # Validate IP address or FQDN format (supports IP:port format)
+    ok, is_fqdn, error = validate_ip_or_host(ip_address)
+    if not ok:
+        return jsonify({'error': error}), 400
     
     allowed_ip = AllowedIP(
         ip_address=ip_address,
@@ -527,6 +437,7 @@ def add_environment_ip(project_id, environment_id):
     )
     db.session.add(allowed_ip)
     db.session.commit()
+    invalidate_whitelist(project_id)
     
     return jsonify({'message': 'IP added successfully'})
 
@@ -535,24 +446,24 @@ def add_environment_ip(project_id, environment_id):
 @require_project_permission('reader')
 def get_environment_ips(project_id, environment_id):
     """Get environment-specific IP whitelist."""
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first_or_404()
-    
-    allowed_ips = AllowedIP.query.filter_by(
-        project_id=project_id,
-        environment_id=environment_id
+    environment = db.session.get(Environment, environment_id)
+    if not environment or environment.project_id != project_id:
+        abort(404)
+    
+    # Select only the columns the response needs; skips ORM object construction
+    rows = db.session.execute(
+        db.select(AllowedIP.id, AllowedIP.ip_address, AllowedIP.description, AllowedIP.created_at).where(
+            AllowedIP.project_id == project_id,
+            AllowedIP.environment_id == environment_id
+        )
     ).all()
     
-    ips = []
-    for ip in allowed_ips:
-        ips.append({
-            'id': ip.id,
-            'ip_address': ip.ip_address,
-            'description': ip.description,
-            'created_at': ip.created_at.strftime('%Y-%m-%d %H:%M')
-        })
+    ips = [{
+        'id': row.id,
+        'ip_address': row.ip_address,
+        'description': row.description,
+        'created_at': row.created_at.strftime('%Y-%m-%d %H:%M')
+    } for row in rows]
     
     return jsonify({'ips': ips})
 
@@ -561,14 +472,19 @@ def get_environment_ips(project_id, environment_id):
 @require_project_permission('owner')
 def remove_environment_ip(project_id, environment_id, ip_id):
     """Remove an IP from environment-specific whitelist."""
-    allowed_ip = AllowedIP.query.filter_by(
-        id=ip_id,
-        project_id=project_id,
-        environment_id=environment_id
-    ).first_or_404()
+    deleted = db.session.execute(
+        db.delete(AllowedIP).where(
+            AllowedIP.id == ip_id,
+            AllowedIP.project_id == project_id,
+            AllowedIP.environment_id == environment_id
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    
+    if not deleted:
+        abort(404)
     
-    db.session.delete(allowed_ip)
     db.session.commit()
+    invalidate_whitelist(project_id)
     
     return jsonify({'message': 'IP removed successfully'})
 
@@ -583,36 +499,24 @@ def create_config(project_id, environment_id):
     if not data or 'key' not in data or 'value' not in data:
         return jsonify({'error': 'Key and value are required'}), 400
     
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first()
+    environment = db.session.get(Environment, environment_id)
     
-    if not environment:
+    if not environment or environment.project_id != project_id:
         return jsonify({'error': 'Environment not found'}), 404
     
-    # Check if config already exists
-    config = Config.query.filter_by(
-        key=data['key'],
-        environment_id=environment.id
-    ).first()
-    
-    if config:
-        config.value = data['value']
-        config.updated_at = datetime.utcnow()
-    else:
-        config = Config(
-            key=data['key'],
-            value=data['value'],
-            environment_id=environment.id
-        )
-        db.session.add(config)
+    # Insert or update the config in one statement
+    upsert(Config, [{
+        'key': data['key'],
+        'value': data['value'],
+        'environment_id': environment.id
+    }], ['environment_id', 'key'], ['value'], updated_at=utcnow())
     
     db.session.commit()
+    invalidate_environment_cache(environment)
     
     return jsonify({
         'message': 'Configuration saved successfully',
-        'key': config.key
+        'key': data['key']
     })
 
 @projects_bp.route('/<int:project_id>/environment/<int:environment_id>/secret', methods=['POST'])
@@ -625,12 +529,9 @@ def create_secret(project_id, environment_id):
     if not data or 'key' not in data or 'value' not in data:
         return jsonify({'error': 'Key and value are required'}), 400
     
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first()
+    environment = db.session.get(Environment, environment_id)
     
-    if not environment:
+    if not environment or environment.project_id != project_id:
         return jsonify({'error': 'Environment not found'}), 404
     
     try:
@@ -640,28 +541,19 @@ def create_secret(project_id, environment_id):
             environment.secret_key
         )
         
-        # Check if secret already exists
-        secret = Secret.query.filter_by(
-            key=data['key'],
-            environment_id=environment.id
-        ).first()
-        
-        if secret:
-            secret.encrypted_value = encrypted_value
-            secret.updated_at = datetime.utcnow()
-        else:
-            secret = Secret(
-                key=data['key'],
-                encrypted_value=encrypted_value,
-                environment_id=environment.id
-            )
-            db.session.add(secret)
+        # Insert or update the secret in one statement
+        upsert(Secret, [{
+            'key': data['key'],
+            'encrypted_value': encrypted_value,
+            'environment_id': environment.id
+        }], ['environment_id', 'key'], ['encrypted_value'], updated_at=utcnow())
         
         db.session.commit()
+        invalidate_environment_cache(environment)
         
         return jsonify({
             'message': 'Secret saved successfully',
-            'key': secret.key
+            'key': data['key']
         })
     
     except Exception as e:
@@ -672,24 +564,23 @@ def create_secret(project_id, environment_id):
 @require_project_permission('maintainer')
 def delete_config(project_id, environment_id, config_key):
     """Delete a configuration value."""
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first()
+    environment = db.session.get(Environment, environment_id)
     
-    if not environment:
+    if not environment or environment.project_id != project_id:
         return jsonify({'error': 'Environment not found'}), 404
     
-    config = Config.query.filter_by(
-        key=config_key,
-        environment_id=environment.id
-    ).first()
+    deleted = db.session.execute(
+        db.delete(Config).where(
+            Config.key == config_key,
+            Config.environment_id == environment.id
+        ).execution_options(synchronize_session=False)
+    ).rowcount
     
-    if not config:
+    if not deleted:
         return jsonify({'error': 'Configuration not found'}), 404
     
-    db.session.delete(config)
     db.session.commit()
+    invalidate_environment_cache(environment)
     
     flash('Configuration deleted successfully', 'success')
     return redirect(url_for('projects.view_environment', project_id=project_id, environment_id=environment_id))
@@ -699,24 +590,23 @@ def delete_config(project_id, environment_id, config_key):
 @require_project_permission('maintainer')
 def delete_secret(project_id, environment_id, secret_key):
     """Delete a secret value."""
-    environment = Environment.query.filter_by(
-        id=environment_id,
-        project_id=project_id
-    ).first()
+    environment = db.session.get(Environment, environment_id)
     
-    if not environment:
+    if not environment or environment.project_id != project_id:
         return jsonify({'error': 'Environment not found'}), 404
     
-    secret = Secret.query.filter_by(
-        key=secret_key,
-        environment_id=environment.id
-    ).first()
+    deleted = db.session.execute(
+        db.delete(Secret).where(
+            Secret.key == secret_key,
+            Secret.environment_id == environment.id
+        ).execution_options(synchronize_session=False)
+    ).rowcount
     
-    if not secret:
+    if not deleted:
         return jsonify({'error': 'Secret not found'}), 404
     
-    db.session.delete(secret)
     db.session.commit()
+    invalidate_environment_cache(environment)
     
     flash('Secret deleted successfully', 'success')
     return redirect(url_for('projects.view_environment', project_id=project_id, environment_id=environment_id))
\ No newline at end of file
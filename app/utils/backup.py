@@ -1,117 +1,249 @@
-import json
+import base64
+import orjson
 import zipfile
 import io
+import struct
 from datetime import datetime
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload
 from app import db
 from app.models import Project, Environment, Config, Secret, ProjectUser, AllowedIP, User
-from app.utils.encryption import EncryptionManager
+from app.utils.encryption import EncryptionManager, LEGACY_KDF_PARAMS
+from app.utils.loading import eager_options
+
+# Archive layout version written to info.json; 1.0 archives double base64-encode the payload,
+# 1.2 archives store it as framed Fernet chunks
+BACKUP_FORMAT_VERSION = '1.2'
+
+# Rows per multi-row INSERT statement when restoring a backup
+RESTORE_INSERT_PAGE_SIZE = 1000
+
+# Plaintext bytes encrypted per frame, bounding the ciphertext held in memory at once
+BACKUP_CHUNK_SIZE = 64 * 1024
+
+# Each frame's plaintext starts with its index and a last-frame flag, so frames
+# can't be dropped, reordered or truncated without failing the restore
+_FRAME_HEADER = struct.Struct('>IB')
+
+def _write_encrypted_frames(stream, pieces, key):
+    """Write byte pieces to stream as length-prefixed Fernet tokens of BACKUP_CHUNK_SIZE plaintext bytes.
+
+    At most one frame plus the current piece is buffered, so the plaintext never has to be whole in memory.
+    """
+    def write_frame(index, chunk, last):
+        token = EncryptionManager.encrypt_bytes(_FRAME_HEADER.pack(index, last) + chunk, key)
+        stream.write(len(token).to_bytes(4, 'big'))
+        stream.write(token)
+    
+    buffer = bytearray()
+    index = 0
+    for piece in pieces:
+        buffer += piece
+        # Hold back the final chunk until input ends, since only then is it known to be last
+        if len(buffer) > BACKUP_CHUNK_SIZE:
+            offset = 0
+            with memoryview(buffer) as view:
+                while len(buffer) - offset > BACKUP_CHUNK_SIZE:
+                    write_frame(index, view[offset:offset + BACKUP_CHUNK_SIZE], False)
+                    offset += BACKUP_CHUNK_SIZE
+                    index += 1
+            del buffer[:offset]
+    write_frame(index, buffer, True)
+
+def _read_encrypted_frames(stream, key):
+    """Read and decrypt frames written by _write_encrypted_frames, checking their order."""
+    data = bytearray()
+    index = 0
+    while True:
+        prefix = stream.read(4)
+        token = stream.read(int.from_bytes(prefix, 'big')) if len(prefix) == 4 else b''
+        if not token:
+            raise ValueError("Invalid backup file: truncated encrypted data")
+        
+        plaintext = EncryptionManager.decrypt_bytes(token, key)
+        frame_index, last = _FRAME_HEADER.unpack_from(plaintext)
+        if frame_index != index:
+            raise ValueError("Invalid backup file: encrypted data out of order")
+        data += memoryview(plaintext)[_FRAME_HEADER.size:]
+        
+        if last:
+            if stream.read(1):
+                raise ValueError("Invalid backup file: trailing data after last frame")
+            return bytes(data)
+        index += 1
+
+# scrypt cost for new backups: 32 MiB of memory per derivation
+SCRYPT_PARAMS = {'name': 'scrypt', 'n': 2 ** 15, 'r': 8, 'p': 1}
+
+def _backup_kdf_params():
+    """KDF settings for new backups, from BACKUP_KDF / BACKUP_KDF_ITERATIONS."""
+    if current_app.config.get('BACKUP_KDF', 'scrypt') == 'pbkdf2':
+        return {'name': 'pbkdf2', 'iterations': current_app.config.get('BACKUP_KDF_ITERATIONS', 600000)}
+    return SCRYPT_PARAMS
+
+def _check_int(params, name, low, high):
+    value = params.get(name)
+    if type(value) is not int or not low <= value <= high:
+        raise ValueError(f"Invalid backup file: unsupported {params['name']} {name}")
+
+def _restore_kdf_params(info):
+    """KDF settings recorded in an uploaded backup, checked before any key is derived.
+
+    Costs are capped at what this server would use for a new backup (or the legacy
+    PBKDF2 settings), so a crafted info.json can't pin a worker or exhaust memory.
+    """
+    # Archives without recorded KDF settings were made with the original PBKDF2 settings
+    params = info.get('kdf', LEGACY_KDF_PARAMS)
+    if not isinstance(params, dict) or params.get('name') not in ('pbkdf2', 'scrypt'):
+        raise ValueError("Invalid backup file: unsupported key derivation function")
+    
+    if params['name'] == 'pbkdf2':
+        max_iterations = max(
+            current_app.config.get('BACKUP_KDF_ITERATIONS', 600000),
+            LEGACY_KDF_PARAMS['iterations']
+        )
+        _check_int(params, 'iterations', 1, max_iterations)
+    else:
+        _check_int(params, 'n', 2, SCRYPT_PARAMS['n'])
+        _check_int(params, 'r', 1, SCRYPT_PARAMS['r'])
+        _check_int(params, 'p', 1, SCRYPT_PARAMS['p'])
+    return params
+
+def _environment_data(env, configs, secrets):
+    """Backup entry for one environment; configs and secrets are rows or models with the same attributes."""
+    return {
+        'name': env.name,
+        'secret_key': env.secret_key,
+        'created_at': env.created_at,
+        'configs': [
+            {'key': config.key, 'value': config.value, 'created_at': config.created_at, 'updated_at': config.updated_at}
+            for config in configs
+        ],
+        # Secrets stay encrypted
+        'secrets': [
+            {'key': secret.key, 'encrypted_value': secret.encrypted_value, 'created_at': secret.created_at, 'updated_at': secret.updated_at}
+            for secret in secrets
+        ]
+    }
+
+def _users_data(project_id):
+    project_users = ProjectUser.query.options(*eager_options(
+        joinedload(ProjectUser.user)
+    )).filter_by(project_id=project_id).all()
+    return [
+        {'username': pu.user.username, 'email': pu.user.email, 'role': pu.role, 'created_at': pu.created_at}
+        for pu in project_users
+    ]
+
+def _allowed_ips_data(project_id):
+    return [
+        {'ip_address': ip.ip_address, 'description': ip.description, 'created_at': ip.created_at}
+        for ip in AllowedIP.query.filter_by(project_id=project_id).all()
+    ]
+
+def _get_project(project_id):
+    project = db.session.get(Project, project_id)
+    if not project:
+        raise ValueError("Project not found")
+    return project
+
+def _iter_backup_json(project_id, include_users):
+    """Yield the same document as create_project_backup as JSON fragments, one environment at a time.
+
+    Each environment's configs and secrets are fetched and serialized on their own, so memory
+    is bounded by the largest environment rather than the whole project.
+    """
+    project = _get_project(project_id)
+    yield b'{"version":"1.0","created_at":' + orjson.dumps(datetime.utcnow())
+    yield b',"project":' + orjson.dumps({
+        'name': project.name,
+        'description': project.description,
+        'created_at': project.created_at
+    })
+    
+    yield b',"environments":['
+    environments = Environment.query.filter_by(project_id=project_id).all()
+    for position, env in enumerate(environments):
+        configs = db.session.execute(
+            db.select(Config.key, Config.value, Config.created_at, Config.updated_at)
+            .where(Config.environment_id == env.id)
+        ).all()
+        secrets = db.session.execute(
+            db.select(Secret.key, Secret.encrypted_value, Secret.created_at, Secret.updated_at)
+            .where(Secret.environment_id == env.id)
+        ).all()
+        yield (b',' if position else b'') + orjson.dumps(_environment_data(env, configs, secrets))
+        del configs, secrets
+    
+    yield b'],"users":' + orjson.dumps(_users_data(project_id) if include_users else None)
+    yield b',"allowed_ips":' + orjson.dumps(_allowed_ips_data(project_id)) + b'}'
 
 class BackupManager:
     @staticmethod
     def create_project_backup(project_id, include_users=True):
-        """Create a complete backup of a project."""
-        project = Project.query.get(project_id)
-        if not project:
-            raise ValueError("Project not found")
+        """Create a complete backup of a project.
+
+        Timestamps are left as datetime objects; orjson writes them in isoformat() form when serializing.
+        """
+        project = _get_project(project_id)
+        
+        # Backup environments with their configs and secrets, loaded in one batch per table
+        environments = Environment.query.options(*eager_options(
+            selectinload(Environment.configs),
+            selectinload(Environment.secrets)
+        )).filter_by(project_id=project_id).all()
         
-        backup_data = {
+        return {
             'version': '1.0',
-            'created_at': datetime.utcnow().isoformat(),
+            'created_at': datetime.utcnow(),
             'project': {
                 'name': project.name,
                 'description': project.description,
-                'created_at': project.created_at.isoformat()
+                'created_at': project.created_at
             },
-            'environments': [],
-            'users': [] if include_users else None,
-            'allowed_ips': []
+            'environments': [_environment_data(env, env.configs, env.secrets) for env in environments],
+            'users': _users_data(project_id) if include_users else None,
+            'allowed_ips': _allowed_ips_data(project_id)
         }
-        
-        # Backup environments with their configs and secrets
-        environments = Environment.query.filter_by(project_id=project_id).all()
-        for env in environments:
-            env_data = {
-                'name': env.name,
-                'secret_key': env.secret_key,
-                'created_at': env.created_at.isoformat(),
-                'configs': [],
-                'secrets': []
-            }
-            
-            # Backup configs
-            configs = Config.query.filter_by(environment_id=env.id).all()
-            for config in configs:
-                env_data['configs'].append({
-                    'key': config.key,
-                    'value': config.value,
-                    'created_at': config.created_at.isoformat(),
-                    'updated_at': config.updated_at.isoformat()
-                })
-            
-            # Backup secrets (keep encrypted)
-            secrets = Secret.query.filter_by(environment_id=env.id).all()
-            for secret in secrets:
-                env_data['secrets'].append({
-                    'key': secret.key,
-                    'encrypted_value': secret.encrypted_value,
-                    'created_at': secret.created_at.isoformat(),
-                    'updated_at': secret.updated_at.isoformat()
-                })
-            
-            backup_data['environments'].append(env_data)
-        
-        # Backup project users (if requested)
-        if include_users:
-            project_users = ProjectUser.query.filter_by(project_id=project_id).all()
-            for pu in project_users:
-                user = User.query.get(pu.user_id)
-                backup_data['users'].append({
-                    'username': user.username,
-                    'email': user.email,
-                    'role': pu.role,
-                    'created_at': pu.created_at.isoformat()
-                })
-        
-        # Backup allowed IPs
-        allowed_ips = AllowedIP.query.filter_by(project_id=project_id).all()
-        for ip in allowed_ips:
-            backup_data['allowed_ips'].append({
-                'ip_address': ip.ip_address,
-                'description': ip.description,
-                'created_at': ip.created_at.isoformat()
-            })
-        
-        return backup_data
     
     @staticmethod
-    def create_encrypted_backup(project_id, password, include_users=True):
-        """Create an encrypted backup of a project."""
-        backup_data = BackupManager.create_project_backup(project_id, include_users)
-        
-        # Convert to JSON string
-        json_data = json.dumps(backup_data, indent=2)
+    def create_encrypted_backup(project_id, password, include_users=True, fileobj=None):
+        """Create an encrypted backup of a project.
+
+        The ZIP is written to fileobj if given (and fileobj is returned), otherwise returned as bytes.
+        """
+        # Check the project before paying for key derivation
+        _get_project(project_id)
         
-        # Encrypt the backup
-        key, salt = EncryptionManager.derive_key_from_password(password)
-        encrypted_backup = EncryptionManager.encrypt_value(json_data, key)
+        kdf_params = _backup_kdf_params()
+        key, salt = EncryptionManager.derive_key_from_password(password, kdf_params=kdf_params)
         
-        # Create a ZIP file with the encrypted backup and salt
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.writestr('backup.encrypted', encrypted_backup)
+        # Create a ZIP file with the encrypted backup and salt. Ciphertext doesn't compress,
+        # so entries are stored and only the small info file is deflated
+        zip_buffer = fileobj if fileobj is not None else io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+            # Serialize and encrypt environment by environment straight into the archive entry
+            with zip_file.open('backup.encrypted', 'w') as entry:
+                _write_encrypted_frames(entry, _iter_backup_json(project_id, include_users), key)
+            
             zip_file.writestr('salt', salt.hex())
-            zip_file.writestr('info.json', json.dumps({
-                'version': '1.0',
+            zip_file.writestr('info.json', orjson.dumps({
+                'version': BACKUP_FORMAT_VERSION,
                 'encrypted': True,
-                'created_at': datetime.utcnow().isoformat()
-            }))
+                'kdf': kdf_params,
+                'created_at': datetime.utcnow()
+            }), compress_type=zipfile.ZIP_DEFLATED)
         
-        zip_buffer.seek(0)
+        if fileobj is not None:
+            return fileobj
         return zip_buffer.getvalue()
     
     @staticmethod
-    def restore_project_backup(backup_data, new_project_name=None, restore_users=False):
-        """Restore a project from backup data."""
+    def restore_project_backup(backup_data, new_project_name=None, restore_users=False, owner_id=None):
+        """Restore a project from backup data in a single transaction.
+
+        owner_id, if given, is made an owner of the restored project.
+        """
         try:
             # Validate backup format
             if 'version' not in backup_data or 'project' not in backup_data:
@@ -124,68 +256,82 @@ class BackupManager:
             if existing_project:
                 raise ValueError(f"Project '{project_name}' already exists")
             
-            # Create new project
+            # Postgres only: skip waiting on the WAL flush for this transaction; a lost restore can be re-run
+            if db.session.get_bind().dialect.name == 'postgresql':
+                db.session.execute(db.text('SET LOCAL synchronous_commit = OFF'))
+            
+            # Create the project and its environments in one flush
+            env_list = backup_data.get('environments', [])
             project = Project(
                 name=project_name,
-                description=backup_data['project']['description']
+                description=backup_data['project']['description'],
+                environments=[
+                    Environment(name=env_data['name'], secret_key=env_data['secret_key'])
+                    for env_data in env_list
+                ]
             )
             db.session.add(project)
-            db.session.flush()  # Get project ID
+            db.session.flush()  # Get project and environment IDs
             
-            # Restore environments
-            for env_data in backup_data.get('environments', []):
-                environment = Environment(
-                    name=env_data['name'],
-                    project_id=project.id,
-                    secret_key=env_data['secret_key']
-                )
-                db.session.add(environment)
-                db.session.flush()  # Get environment ID
-                
+            # Collect the child rows and insert each table in a single executemany
+            config_rows = []
+            secret_rows = []
+            for environment, env_data in zip(project.environments, env_list):
                 # Restore configs
-                for config_data in env_data.get('configs', []):
-                    config = Config(
-                        key=config_data['key'],
-                        value=config_data['value'],
-                        environment_id=environment.id
-                    )
-                    db.session.add(config)
+                config_rows.extend(
+                    {'key': config_data['key'], 'value': config_data['value'], 'environment_id': environment.id}
+                    for config_data in env_data.get('configs', [])
+                )
                 
                 # Restore secrets
-                for secret_data in env_data.get('secrets', []):
-                    secret = Secret(
-                        key=secret_data['key'],
-                        encrypted_value=secret_data['encrypted_value'],
-                        environment_id=environment.id
-                    )
-                    db.session.add(secret)
+                secret_rows.extend(
+                    {'key': secret_data['key'], 'encrypted_value': secret_data['encrypted_value'], 'environment_id': environment.id}
+                    for secret_data in env_data.get('secrets', [])
+                )
             
             # Restore users (if requested and available)
+            roles = {}
             if restore_users and backup_data.get('users'):
-                for user_data in backup_data['users']:
-                    # Find existing user by username or email
-                    user = User.query.filter(
-                        (User.username == user_data['username']) | 
-                        (User.email == user_data['email'])
-                    ).first()
-                    
-                    if user:
-                        # Add user to project
-                        project_user = ProjectUser(
-                            user_id=user.id,
-                            project_id=project.id,
-                            role=user_data['role']
-                        )
-                        db.session.add(project_user)
+                users_data = backup_data['users']
+                
+                # Find existing users by username or email in one query
+                matches = db.session.execute(
+                    db.select(User.id, User.username, User.email).where(
+                        User.username.in_({user_data['username'] for user_data in users_data}) |
+                        User.email.in_({user_data['email'] for user_data in users_data})
+                    )
+                ).all()
+                by_username = {match.username: match.id for match in matches}
+                by_email = {match.email: match.id for match in matches}
+                
+                # Add each matched user to the project once
+                for user_data in users_data:
+                    user_id = by_username.get(user_data['username']) or by_email.get(user_data['email'])
+                    if user_id:
+                        roles.setdefault(user_id, user_data['role'])
+            
+            # The restoring user owns the new project, whatever role the backup gave them
+            if owner_id is not None:
+                roles[owner_id] = 'owner'
+            user_rows = [
+                {'user_id': user_id, 'project_id': project.id, 'role': role}
+                for user_id, role in roles.items()
+            ]
             
             # Restore allowed IPs
-            for ip_data in backup_data.get('allowed_ips', []):
-                allowed_ip = AllowedIP(
-                    ip_address=ip_data['ip_address'],
-                    project_id=project.id,
-                    description=ip_data['description']
-                )
-                db.session.add(allowed_ip)
+            ip_rows = [
+                {'ip_address': ip_data['ip_address'], 'project_id': project.id, 'description': ip_data['description']}
+                for ip_data in backup_data.get('allowed_ips', [])
+            ]
+            
+            # Core table inserts skip the ORM bulk layer; executemany is sent as multi-row
+            # INSERT ... VALUES statements of up to RESTORE_INSERT_PAGE_SIZE rows
+            for model, rows in ((Config, config_rows), (Secret, secret_rows), (ProjectUser, user_rows), (AllowedIP, ip_rows)):
+                if rows:
+                    db.session.execute(
+                        model.__table__.insert().execution_options(insertmanyvalues_page_size=RESTORE_INSERT_PAGE_SIZE),
+                        rows
+                    )
             
             db.session.commit()
             return project
@@ -195,11 +341,11 @@ class BackupManager:
             raise e
     
     @staticmethod
-    def restore_encrypted_backup(zip_data, password, new_project_name=None, restore_users=False):
-        """Restore a project from an encrypted backup."""
+    def restore_encrypted_backup(zip_data, password, new_project_name=None, restore_users=False, owner_id=None):
+        """Restore a project from an encrypted backup (bytes or a seekable file object)."""
         try:
-            # Extract ZIP contents
-            zip_buffer = io.BytesIO(zip_data)
+            # Extract ZIP contents; file objects are read in place rather than copied
+            zip_buffer = io.BytesIO(zip_data) if isinstance(zip_data, (bytes, bytearray)) else zip_data
             with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
                 if 'backup.encrypted' not in zip_file.namelist():
                     raise ValueError("Invalid backup file: missing encrypted backup")
@@ -207,19 +353,31 @@ class BackupManager:
                 if 'salt' not in zip_file.namelist():
                     raise ValueError("Invalid backup file: missing salt")
                 
-                encrypted_backup = zip_file.read('backup.encrypted').decode()
                 salt = bytes.fromhex(zip_file.read('salt').decode())
+                info = orjson.loads(zip_file.read('info.json')) if 'info.json' in zip_file.namelist() else {}
+                
+                key, _ = EncryptionManager.derive_key_from_password(password, salt, _restore_kdf_params(info))
+                
+                # Decrypt the backup; 1.0 archives wrapped a single Fernet token in another layer
+                # of base64, current ones hold framed chunks
+                version = info.get('version', '1.0')
+                if version == '1.0':
+                    # Unwrapped here so the password-derived key skips the environment-key Fernet cache
+                    decrypted_data = EncryptionManager.decrypt_bytes(base64.b64decode(zip_file.read('backup.encrypted')), key)
+                elif version == BACKUP_FORMAT_VERSION:
+                    with zip_file.open('backup.encrypted') as entry:
+                        decrypted_data = _read_encrypted_frames(entry, key)
+                else:
+                    raise ValueError(f"Unsupported backup version: {version}")
             
-            # Decrypt the backup
-            key, _ = EncryptionManager.derive_key_from_password(password, salt)
-            decrypted_data = EncryptionManager.decrypt_value(encrypted_backup, key)
-            backup_data = json.loads(decrypted_data)
+            backup_data = orjson.loads(decrypted_data)
             
             # Restore the project
             return BackupManager.restore_project_backup(
                 backup_data, 
                 new_project_name, 
-                restore_users
+                restore_users,
+                owner_id
             )
             
         except Exception as e:
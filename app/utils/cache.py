@@ -0,0 +1,101 @@
+import redis
+from flask import current_app
+
+def get_redis():
+    """Return the shared Redis client, or None when caching is disabled."""
+    if 'redis' not in current_app.extensions:
+        redis_url = current_app.config.get('REDIS_URL')
+        client = None
+        if redis_url:
+            # Short timeouts so an unreachable Redis fails fast and callers fall back to the database
+            client = redis.Redis.from_url(
+                redis_url,
+                socket_connect_timeout=current_app.config.get('REDIS_CONNECT_TIMEOUT', 0.5),
+                socket_timeout=current_app.config.get('REDIS_SOCKET_TIMEOUT', 0.5)
+            )
+        current_app.extensions['redis'] = client
+    return current_app.extensions['redis']
+
+def cache_get(key):
+    """Get a raw value from the cache. Returns None on miss or if Redis is unavailable."""
+    client = get_redis()
+    if client is None:
+        return None
+
+    try:
+        return client.get(key)
+    except redis.RedisError:
+        return None
+
+def cache_set(key, value, ttl):
+    """Store a raw value in the cache with an expiry in seconds."""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        client.setex(key, ttl, value)
+    except redis.RedisError:
+        pass
+
+def cache_incr(key, ttl):
+    """Increment a counter and refresh its expiry. Returns None if Redis is unavailable."""
+    client = get_redis()
+    if client is None:
+        return None
+
+    try:
+        pipe = client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, ttl)
+        return pipe.execute()[0]
+    except redis.RedisError:
+        return None
+
+def cache_hgetall(key):
+    """Get all fields of a cached hash. Returns None on miss or if Redis is unavailable."""
+    client = get_redis()
+    if client is None:
+        return None
+
+    try:
+        return client.hgetall(key) or None
+    except redis.RedisError:
+        return None
+
+def cache_hset(key, mapping, ttl):
+    """Replace a cached hash and set its expiry in seconds."""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        pipe = client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+def cache_delete(*keys):
+    """Delete keys from the cache."""
+    client = get_redis()
+    if client is None or not keys:
+        return
+
+    try:
+        client.delete(*keys)
+    except redis.RedisError:
+        pass
+
+def cache_publish(channel, message):
+    """Publish a message to other workers listening on a Redis channel."""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        client.publish(channel, message)
+    except redis.RedisError:
+        pass
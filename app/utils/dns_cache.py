@@ -0,0 +1,53 @@
+import ipaddress
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Upper bound on cached hostnames; the cache is simply cleared when it fills up
+DNS_CACHE_MAX_ENTRIES = 2048
+
+# In-process DNS cache: hostname -> (frozenset of ip_address objects, monotonic expiry)
+_resolved = {}
+
+# Shared pool so uncached hostnames are looked up in parallel rather than one after another
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='dns')
+
+def _lookup(host):
+    """Resolve a hostname with getaddrinfo. Failed lookups give an empty set."""
+    addresses = set()
+    try:
+        for addr_info in socket.getaddrinfo(host, None):
+            try:
+                addresses.add(ipaddress.ip_address(addr_info[4][0]))
+            except ValueError:
+                continue
+    except (socket.gaierror, UnicodeError):
+        pass
+    return frozenset(addresses)
+
+def resolve_hosts(hosts):
+    """Resolve hostnames to the union of their IP addresses, cached in-process for DNS_CACHE_TTL seconds.
+
+    Uncached hostnames are resolved concurrently. Failed lookups are cached as an empty set
+    so an unresolvable whitelist entry doesn't reach the resolver on every request.
+    """
+    now = time.monotonic()
+    addresses = set()
+    missing = []
+    for host in dict.fromkeys(hosts):
+        entry = _resolved.get(host)
+        if entry and entry[1] > now:
+            addresses |= entry[0]
+        else:
+            missing.append(host)
+
+    if missing:
+        expires = now + current_app.config.get('DNS_CACHE_TTL', 60)
+        results = _executor.map(_lookup, missing) if len(missing) > 1 else [_lookup(missing[0])]
+        if len(_resolved) + len(missing) > DNS_CACHE_MAX_ENTRIES:
+            _resolved.clear()
+        for host, resolved in zip(missing, results):
+            _resolved[host] = (resolved, expires)
+            addresses |= resolved
+    return addresses
@@ -1,8 +1,29 @@
 import base64
+import hashlib
 import secrets
-from cryptography.fernet import Fernet
+from functools import lru_cache
+from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+# Password KDF settings used when none are given; backups made before KDF settings were recorded used these
+LEGACY_KDF_PARAMS = {'name': 'pbkdf2', 'iterations': 100000}
+
+# Fernet tokens start with version byte 0x80 and a timestamp, which base64 renders as "gAAAAA".
+# Base64 of a token (the old stored form) starts with "Z0FBQUFB" instead.
+_FERNET_TOKEN_PREFIX_STR = 'gAAAAA'
+_FERNET_TOKEN_PREFIX = _FERNET_TOKEN_PREFIX_STR.encode()
+
+@lru_cache(maxsize=256)
+def _fernet(key):
+    """Return a Fernet instance for a key, reusing parsed keys; instances are safe to share across threads.
+
+    Fernet takes the key as str or bytes, so callers pass it through unconverted. Environment
+    keys are always str from the database, giving one cache entry per key. Only environment
+    keys belong here; password-derived backup keys go through encrypt_bytes/decrypt_bytes.
+    """
+    return Fernet(key)
 
 class EncryptionManager:
     @staticmethod
@@ -11,38 +32,91 @@ class EncryptionManager:
         return Fernet.generate_key().decode()
     
     @staticmethod
-    def derive_key_from_password(password: str, salt: bytes = None):
-        """Derive an encryption key from a password using PBKDF2."""
+    def derive_key_from_password(password: str, salt: bytes = None, kdf_params: dict = None):
+        """Derive an encryption key from a password using PBKDF2 or scrypt.
+
+        kdf_params selects the KDF and its cost, e.g. {'name': 'scrypt', 'n': 32768, 'r': 8, 'p': 1};
+        without it the original PBKDF2 settings are used.
+        """
         if salt is None:
             salt = secrets.token_bytes(32)
         
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
+        params = kdf_params or LEGACY_KDF_PARAMS
+        if params['name'] == 'scrypt':
+            kdf = Scrypt(salt=salt, length=32, n=params['n'], r=params['r'], p=params['p'])
+        elif params['name'] == 'pbkdf2':
+            kdf = PBKDF2HMAC(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=salt,
+                iterations=params['iterations'],
+            )
+        else:
+            raise ValueError(f"Unsupported key derivation function: {params['name']}")
         key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
         return key, salt
     
     @staticmethod
-    def encrypt_value(value: str, key: str):
-        """Encrypt a value using the provided key."""
+    def encrypt_value(value, key: str):
+        """Encrypt a value (str or bytes) using the provided key, returning the Fernet token as text."""
+        try:
+            fernet = _fernet(key)
+            return fernet.encrypt(value if isinstance(value, bytes) else value.encode()).decode()
+        except Exception as e:
+            raise ValueError(f"Encryption failed: {str(e)}")
+    
+    @staticmethod
+    def encrypt_many(values, key: str):
+        """Encrypt several values with the same key, building the cipher once."""
         try:
-            fernet = Fernet(key.encode() if isinstance(key, str) else key)
-            encrypted_value = fernet.encrypt(value.encode())
-            return base64.b64encode(encrypted_value).decode()
+            fernet = _fernet(key)
+            return [fernet.encrypt(value.encode()).decode() for value in values]
         except Exception as e:
             raise ValueError(f"Encryption failed: {str(e)}")
     
     @staticmethod
     def decrypt_value(encrypted_value: str, key: str):
-        """Decrypt a value using the provided key."""
+        """Decrypt a value using the provided key.
+
+        Values stored before tokens were kept as-is are base64 of the token; those
+        are detected by their prefix and unwrapped first.
+        """
         try:
-            fernet = Fernet(key.encode() if isinstance(key, str) else key)
-            decoded_value = base64.b64decode(encrypted_value.encode())
-            decrypted_value = fernet.decrypt(decoded_value)
-            return decrypted_value.decode()
+            fernet = _fernet(key)
+            token = encrypted_value.encode()
+            if not token.startswith(_FERNET_TOKEN_PREFIX):
+                token = base64.b64decode(token)
+            return fernet.decrypt(token).decode()
+        except Exception as e:
+            raise ValueError(f"Decryption failed: {str(e)}")
+    
+    @staticmethod
+    def client_format(encrypted_value: str):
+        """Return a stored value in the base64-wrapped form that API clients decode before decrypting."""
+        if encrypted_value.startswith(_FERNET_TOKEN_PREFIX_STR):
+            return base64.b64encode(encrypted_value.encode()).decode()
+        return encrypted_value
+    
+    @staticmethod
+    def encrypt_bytes(data: bytes, key):
+        """Encrypt bytes and return the raw Fernet token, which is already URL-safe base64.
+
+        Used with one-off password-derived keys, so the cipher is not cached.
+        """
+        try:
+            fernet = Fernet(key)
+            return fernet.encrypt(data)
+        except Exception as e:
+            raise ValueError(f"Encryption failed: {str(e)}")
+    
+    @staticmethod
+    def decrypt_bytes(token: bytes, key):
+        """Decrypt a raw Fernet token produced by encrypt_bytes."""
+        try:
+            fernet = Fernet(key)
+            return fernet.decrypt(token)
+        except InvalidToken:
+            raise ValueError("Decryption failed: wrong key or corrupted data")
         except Exception as e:
             raise ValueError(f"Decryption failed: {str(e)}")
     
@@ -51,11 +125,19 @@ class EncryptionManager:
         """Generate a secure API token."""
         return secrets.token_urlsafe(32)
     
+    @staticmethod
+    def hash_api_token(token: str):
+        """Hash an API token for storage and lookup. Only the hash is persisted."""
+        return hashlib.sha256(token.encode()).hexdigest()
+    
     @staticmethod
     def verify_key_format(key: str):
         """Verify that a key is in the correct format for Fernet."""
         try:
-            Fernet(key.encode() if isinstance(key, str) else key)
+            _fernet(key)
             return True
         except:
-            return False
\ No newline at end of file
+            return False
+
+# Shared instance for routes; EncryptionManager holds no per-request state
+encryption_manager = EncryptionManager()
@@ -0,0 +1,11 @@
+from functools import lru_cache
+import orjson
+from flask import current_app
+
+@lru_cache(maxsize=128)
+def _error_body(message):
+    return orjson.dumps({'error': message})
+
+def error_response(message, status):
+    """Build a JSON error response, serializing each distinct message only once."""
+    return current_app.response_class(_error_body(message), status, mimetype='application/json')
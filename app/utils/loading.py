@@ -0,0 +1,12 @@
+from flask import current_app
+from sqlalchemy.orm import raiseload
+
+def eager_options(*options):
+    """Return loader options for a query, plus raiseload('*') when TESTING is enabled.
+
+    In testing any relationship not named in options raises on access instead of
+    lazy loading, so a template that starts triggering N+1 queries fails loudly.
+    """
+    if current_app.config.get('TESTING'):
+        return (*options, raiseload('*'))
+    return options
@@ -0,0 +1,33 @@
+import time
+from functools import wraps
+from flask import current_app, g
+from app.utils.cache import cache_incr
+from app.utils.errors import error_response
+
+# Length of each counting window in seconds
+RATE_LIMIT_WINDOW = 60
+
+def rate_limit():
+    """Decorator to cap requests per API token per minute using a Redis counter.
+
+    Must be applied after require_api_token. Disabled when Redis is not
+    configured or API_RATE_LIMIT is 0.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limit = current_app.config.get('API_RATE_LIMIT', 0)
+            if limit:
+                now = time.time()
+                window = int(now // RATE_LIMIT_WINDOW)
+                count = cache_incr(f'rl:{g.api_token.id}:{window}', RATE_LIMIT_WINDOW)
+                
+                if count is not None and count > limit:
+                    response = error_response('Rate limit exceeded', 429)
+                    response.headers['Retry-After'] = str(RATE_LIMIT_WINDOW - int(now % RATE_LIMIT_WINDOW))
+                    return response
+            
+            return f(*args, **kwargs)
+        
+        return decorated_function
+    return decorator
@@ -0,0 +1,161 @@
+import hashlib
+import time
+from functools import wraps
+from flask import current_app, g, make_response, request
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models import Config, Environment, Secret
+from app.utils.cache import cache_hgetall, cache_hset, cache_delete
+
+# Read endpoints whose response bodies are stored in Redis per environment.
+# Secrets and /all only get ETags: their bodies carry the environment key or
+# decrypted values, and the database itself only holds ciphertext.
+CACHED_ENDPOINTS = ('config',)
+
+# Freshness policies: config key and default for the minimum TTL in seconds
+CACHE_POLICIES = {
+    'short': ('API_RESPONSE_CACHE_TTL', 60),
+}
+
+# Extra seconds added to twice the generation time for slow responses
+FRESHNESS_BUFFER = 5
+
+def _cache_key(endpoint, project_id, environment_name, environment_id):
+    return f'api:{endpoint}:{project_id}:{environment_name}:{environment_id}'
+
+def _environment_etag(environment_id, project_id, environment_name):
+    """Build an ETag for an environment's data from one aggregate query.
+
+    Row counts are included because deleting a key does not move MAX(updated_at).
+    Returns None when the token's environment is not the requested one, so the
+    handler can reject the request before any 304 is sent.
+    """
+    def stats(model):
+        where = model.environment_id == environment_id
+        return (
+            db.select(db.func.max(model.updated_at)).where(where).scalar_subquery(),
+            db.select(db.func.count(model.id)).where(where).scalar_subquery()
+        )
+
+    accessible = db.select(Environment.id).where(
+        Environment.id == environment_id,
+        Environment.project_id == project_id,
+        Environment.name == environment_name
+    ).scalar_subquery()
+
+    row = db.session.execute(db.select(accessible, *stats(Config), *stats(Secret))).one()
+    if row[0] is None:
+        return None
+    version = f'{environment_id}|' + '|'.join(str(value) for value in row[1:])
+    return hashlib.sha1(version.encode()).hexdigest()
+
+def _cache_control():
+    return current_app.config.get('API_CACHE_CONTROL', 'private, max-age=30, stale-while-revalidate=60')
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = _cache_control()
+    return response
+
+def _freshness(policy, generation_time):
+    """Seconds a cached response stays fresh: the policy minimum, or longer for slow responses."""
+    config_key, default_ttl = CACHE_POLICIES[policy]
+    min_ttl = current_app.config.get(config_key, default_ttl)
+    return max(min_ttl, int(generation_time * 2) + FRESHNESS_BUFFER)
+
+def _cached_body(entry, status):
+    return current_app.response_class(
+        entry[b'body'], int(entry[b'code']), {'X-Cache': status}, mimetype='application/json'
+    )
+
+def cached_response(endpoint, policy='short', store=True):
+    """Decorator to cache a read endpoint's serialized JSON response in Redis.
+
+    Must be applied after require_api_token so the token has already been
+    validated. The token's project and environment are checked against the
+    URL before any 304 or cached body is returned; mismatches fall through to
+    the handler, which produces the 403/404.
+    Responses carry a weak ETag, and a matching If-None-Match gets a 304.
+    Entries outlive their freshness window so that the last good response
+    can still be served (X-Cache: STALE) if the database is unavailable.
+    With store=False the body is never written to Redis; the endpoint still
+    gets ETags and 304 responses.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if g.api_token.project_id != kwargs['project_id']:
+                return f(*args, **kwargs)
+
+            key = _cache_key(
+                endpoint,
+                kwargs['project_id'],
+                kwargs['environment_name'],
+                g.api_token.environment_id
+            )
+
+            # Cached entries are hashes of {etag, body, code, ts, fresh_until}
+            # Entries are only written after the handler accepted this environment name
+            # for the token's environment id, so a hit implies the same access check passed
+            entry = cache_hgetall(key) if store else None
+            if entry is not None and float(entry[b'fresh_until']) > time.time():
+                # Serve the stored bytes as-is: no query, no dict, no re-serialization
+                etag = entry[b'etag'].decode()
+                if request.if_none_match.contains_weak(etag):
+                    return _not_modified(etag)
+                response = _cached_body(entry, 'HIT')
+            else:
+                try:
+                    started = time.monotonic()
+                    etag = _environment_etag(
+                        g.api_token.environment_id,
+                        kwargs['project_id'],
+                        kwargs['environment_name']
+                    )
+                    if etag is None:
+                        return f(*args, **kwargs)
+                    if request.if_none_match.contains_weak(etag):
+                        return _not_modified(etag)
+
+                    if entry is not None and entry[b'etag'].decode() == etag:
+                        # Data is unchanged since the entry was stored, so reuse its body
+                        response = _cached_body(entry, 'REVALIDATED')
+                    else:
+                        response = make_response(f(*args, **kwargs))
+                        response.headers['X-Cache'] = 'MISS'
+                except SQLAlchemyError:
+                    db.session.rollback()
+                    if entry is None:
+                        raise
+                    # Fall back to the last good response while the database is unavailable
+                    current_app.logger.warning('Serving stale response for %s after a database error', key)
+                    etag = entry[b'etag'].decode()
+                    response = _cached_body(entry, 'STALE')
+                else:
+                    # Only successful responses are cached; errors always hit the handler
+                    if store and response.status_code == 200:
+                        now = time.time()
+                        fresh_for = _freshness(policy, time.monotonic() - started)
+                        cache_hset(key, {
+                            'etag': etag,
+                            'body': response.get_data(),
+                            'code': response.status_code,
+                            'ts': now,
+                            'fresh_until': now + fresh_for
+                        }, fresh_for + current_app.config.get('API_RESPONSE_STALE_TTL', 3600))
+
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = _cache_control()
+            return response
+
+        return decorated_function
+    return decorator
+
+def invalidate_environment_cache(environment):
+    """Drop cached read responses for an environment after its configs or secrets change."""
+    cache_delete(*[
+        _cache_key(endpoint, environment.project_id, environment.name, environment.id)
+        for endpoint in CACHED_ENDPOINTS
+    ])
@@ -0,0 +1,32 @@
+from sqlalchemy import DateTime
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+# DATETIME on MySQL defaults to whole seconds; keep the microseconds utcnow() produces
+PreciseDateTime = DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
+
+class utcnow(FunctionElement):
+    """Current UTC time evaluated by the database, with sub-second precision where supported.
+
+    Matches the naive UTC values written by datetime.utcnow() elsewhere in the schema.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+@compiles(utcnow, 'postgresql')
+def _pg_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow, 'mysql')
+def _mysql_utcnow(element, compiler, **kw):
+    return 'UTC_TIMESTAMP(6)'
+
+@compiles(utcnow, 'sqlite')
+def _sqlite_utcnow(element, compiler, **kw):
+    # CURRENT_TIMESTAMP only has second resolution on SQLite
+    return "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+import orjson
+from flask import current_app, g
+from app import db
+from app.models import APIToken
+from app.utils.cache import get_redis, cache_get, cache_set, cache_delete, cache_publish
+from app.utils.encryption import EncryptionManager
+
+# Lightweight stand-in for APIToken with only the fields needed to authorize a request
+CachedToken = namedtuple('CachedToken', ['id', 'project_id', 'environment_id', 'is_active', 'expires_at'])
+
+# Revocations are broadcast on this channel so every worker drops its in-process copy
+INVALIDATION_CHANNEL = 'token:revoked'
+
+# In-process token cache: token_hash -> (CachedToken, monotonic expiry).
+# Only used while a pub/sub subscriber is running, otherwise a revoked token
+# could stay valid on other workers until its entry expired.
+_local_tokens = {}
+_subscriber_lock = threading.Lock()
+_subscriber = None
+
+def _cache_key(token_hash):
+    return f'tok:{token_hash}'
+
+def _on_invalidation(message):
+    token_hash = message['data']
+    _local_tokens.pop(token_hash.decode() if isinstance(token_hash, bytes) else token_hash, None)
+
+def _on_subscriber_error(error, pubsub, thread):
+    """Stop using the in-process cache if the subscriber loses its connection."""
+    global _subscriber
+    _subscriber = None
+    _local_tokens.clear()
+    thread.stop()
+
+def _local_cache_enabled():
+    """Start the revocation subscriber on first use. Returns False when Redis is not configured."""
+    global _subscriber
+    if _subscriber is not None:
+        return True
+
+    client = get_redis()
+    if client is None:
+        return False
+
+    with _subscriber_lock:
+        if _subscriber is None:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidation})
+                _subscriber = pubsub.run_in_thread(
+                    sleep_time=1,
+                    daemon=True,
+                    exception_handler=_on_subscriber_error
+                )
+            except Exception:
+                return False
+    return True
+
+def get_token(token):
+    """Look up an active API token, checking the request, in-process and Redis caches before the database."""
+    token_hash = EncryptionManager.hash_api_token(token)
+
+    # Decorator and after_request both resolve the token; only do the work once per request
+    lookups = g.setdefault('_api_token_lookups', {})
+    if token_hash in lookups:
+        return lookups[token_hash]
+
+    use_local = _local_cache_enabled()
+    if use_local:
+        entry = _local_tokens.get(token_hash)
+        if entry and entry[1] > time.monotonic():
+            lookups[token_hash] = entry[0]
+            return entry[0]
+
+    cached = cache_get(_cache_key(token_hash))
+    if cached is not None:
+        data = orjson.loads(cached)
+        data['expires_at'] = datetime.fromisoformat(data['expires_at'])
+        api_token = CachedToken(**data)
+    else:
+        # Tuple select on the auth path; no APIToken instance is built
+        row = db.session.execute(
+            db.select(
+                APIToken.id,
+                APIToken.project_id,
+                APIToken.environment_id,
+                APIToken.is_active,
+                APIToken.expires_at
+            ).where(APIToken.token_hash == token_hash, APIToken.is_active == True)
+        ).first()
+        api_token = None
+        if row:
+            api_token = CachedToken(**row._mapping)
+            # orjson writes expires_at in isoformat() form
+            cache_set(
+                _cache_key(token_hash),
+                orjson.dumps(api_token._asdict()),
+                current_app.config.get('API_TOKEN_CACHE_TTL', 60)
+            )
+
+    if use_local and api_token:
+        ttl = current_app.config.get('API_TOKEN_LOCAL_CACHE_TTL', 10)
+        _local_tokens[token_hash] = (api_token, time.monotonic() + ttl)
+
+    lookups[token_hash] = api_token
+    return api_token
+
+def invalidate_token(token_hash):
+    """Drop a token from every cache layer after it is revoked or toggled."""
+    _local_tokens.pop(token_hash, None)
+    cache_delete(_cache_key(token_hash))
+    cache_publish(INVALIDATION_CHANNEL, token_hash)
@@ -0,0 +1,48 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from app import db
+
+_DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+    'mysql': mysql.insert,
+}
+
+def dialect_insert(model):
+    """Return an INSERT construct for the active database dialect (supports conflict clauses)."""
+    dialect = db.session.get_bind().dialect.name
+    return _DIALECT_INSERTS.get(dialect, insert)(model)
+
+def insert_ignore(model, **values):
+    """Insert a row unless it conflicts with a unique constraint, in one statement.
+
+    Returns True if the row was inserted.
+    """
+    stmt = dialect_insert(model).values(**values)
+    if db.session.get_bind().dialect.name == 'mysql':
+        stmt = stmt.prefix_with('IGNORE')
+    else:
+        stmt = stmt.on_conflict_do_nothing()
+    return db.session.execute(stmt).rowcount > 0
+
+def upsert(model, rows, index_elements, update_columns, **update_values):
+    """Insert rows, updating update_columns on rows that already exist, in one statement.
+
+    index_elements names the unique constraint columns used to detect existing rows.
+    update_values sets extra columns on existing rows to fixed values or SQL expressions,
+    since Column.onupdate is not applied to the conflict UPDATE.
+    """
+    if not rows:
+        return
+    
+    stmt = dialect_insert(model).values(rows)
+    if db.session.get_bind().dialect.name == 'mysql':
+        stmt = stmt.on_duplicate_key_update(
+            {**{column: stmt.inserted[column] for column in update_columns}, **update_values}
+        )
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={**{column: stmt.excluded[column] for column in update_columns}, **update_values}
+        )
+    db.session.execute(stmt)
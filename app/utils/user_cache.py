@@ -0,0 +1,48 @@
+import orjson
+from flask import current_app
+from flask_login import UserMixin
+from app import db
+from app.models import User
+from app.utils.cache import cache_get, cache_set, cache_delete
+
+def _cache_key(user_id):
+    return f'user:{user_id}'
+
+class CachedUser(UserMixin):
+    """Logged-in user restored from the cache.
+
+    Holds the fields read on most page loads. Anything else (created_at,
+    check_password, ...) loads the User row on first access.
+    """
+
+    def __init__(self, id, username, email, is_admin):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = is_admin
+
+    def __getattr__(self, name):
+        user = self.__dict__.get('_user')
+        if user is None:
+            user = self.__dict__['_user'] = db.session.get(User, self.id)
+        return getattr(user, name)
+
+def load_cached_user(user_id):
+    """Load the session user, using the Redis cache before the database."""
+    cached = cache_get(_cache_key(user_id))
+    if cached is not None:
+        return CachedUser(**orjson.loads(cached))
+
+    user = db.session.get(User, int(user_id))
+    if user:
+        cache_set(_cache_key(user_id), orjson.dumps({
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'is_admin': user.is_admin
+        }), current_app.config.get('USER_CACHE_TTL', 300))
+    return user
+
+def invalidate_user(user_id):
+    """Drop a cached user after their profile, password or admin status changes."""
+    cache_delete(_cache_key(user_id))
@@ -0,0 +1,51 @@
+import ipaddress
+import re
+
+# RFC 1123 hostname: dot-separated labels of letters, digits and inner hyphens
+_HOSTNAME_RE = re.compile(
+    r'(?=.{1,253}$)[a-z0-9]([-a-z0-9]{0,61}[a-z0-9])?(\.[a-z0-9]([-a-z0-9]{0,61}[a-z0-9])?)*',
+    re.IGNORECASE
+)
+
+def is_valid_hostname(host):
+    """Check hostname syntax without a DNS lookup.
+
+    Names are resolved when requests are checked against the whitelist, so
+    validation only needs to reject malformed input. An all-numeric last
+    label is rejected so that malformed IPv4 addresses are not taken as names.
+    """
+    host = host.rstrip('.')
+    return bool(_HOSTNAME_RE.fullmatch(host)) and not host.rsplit('.', 1)[-1].isdigit()
+
+def _parse_ip(value):
+    """Parse an IP address or CIDR network, returning None if the value is neither."""
+    try:
+        if '/' in value:
+            return ipaddress.ip_network(value, strict=False)
+        return ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+def validate_ip_or_host(value):
+    """Validate an IP, CIDR, hostname or host:port whitelist entry.
+
+    Returns (ok, is_fqdn, error). Checks run cheapest first: port split,
+    then IP parsing, then hostname syntax.
+    """
+    host = value
+    invalid_error = 'Invalid IP address, CIDR, hostname, or IP:port format'
+    
+    # Exactly one colon means host:port; IPv6 addresses have several
+    if value.count(':') == 1:
+        host_part, port = value.rsplit(':', 1)
+        if port.isdigit():
+            if not 1 <= int(port) <= 65535:
+                return False, False, 'Port number must be between 1 and 65535'
+            host = host_part
+            invalid_error = 'Invalid IP address or hostname in IP:port format'
+    
+    if _parse_ip(host) is not None:
+        return True, False, None
+    if is_valid_hostname(host):
+        return True, True, None
+    return False, False, invalid_error
@@ -0,0 +1,95 @@
+import ipaddress
+from collections import namedtuple
+from functools import lru_cache
+import orjson
+from flask import current_app, g
+from app import db
+from app.models import AllowedIP, Environment
+from app.utils.cache import cache_get, cache_set, cache_delete
+
+# The AllowedIP fields read by the IP and origin whitelist checks
+CachedAllowedIP = namedtuple('CachedAllowedIP', ['ip_address', 'is_fqdn'])
+
+# Whitelist entries grouped by how a client IP is matched: exact addresses, networks, hostnames to resolve
+ClassifiedWhitelist = namedtuple('ClassifiedWhitelist', ['addresses', 'networks', 'hostnames'])
+
+def _cache_key(project_id, environment_id):
+    return f'wl:{project_id}:{environment_id or "all"}'
+
+def get_allowed_ips(project_id, environment_id=None):
+    """Get the whitelist entries for a project, or for one environment plus project-wide entries, as a tuple.
+
+    Results are memoized on g for the request and cached in Redis across requests.
+    """
+    key = _cache_key(project_id, environment_id)
+    lookups = g.setdefault('_allowed_ip_lookups', {})
+    if key in lookups:
+        return lookups[key]
+
+    cached = cache_get(key)
+    if cached is not None:
+        allowed_ips = tuple(CachedAllowedIP(*entry) for entry in orjson.loads(cached))
+    else:
+        query = db.select(AllowedIP.ip_address, AllowedIP.is_fqdn).where(AllowedIP.project_id == project_id)
+        if environment_id:
+            query = query.where(
+                (AllowedIP.environment_id == environment_id) |
+                (AllowedIP.environment_id == None)
+            )
+        allowed_ips = tuple(CachedAllowedIP(*row) for row in db.session.execute(query))
+        cache_set(
+            key,
+            orjson.dumps([list(entry) for entry in allowed_ips]),
+            current_app.config.get('WHITELIST_CACHE_TTL', 300)
+        )
+
+    lookups[key] = allowed_ips
+    return allowed_ips
+
+@lru_cache(maxsize=1024)
+def classify_allowed_ips(allowed_ips):
+    """Parse whitelist entries once into exact addresses, networks and hostnames.
+
+    The cache is keyed by the entries themselves, so an edited whitelist is simply
+    a new key and nothing needs invalidating.
+    """
+    addresses = set()
+    networks = []
+    hostnames = []
+    for allowed_ip in allowed_ips:
+        host = allowed_ip.ip_address
+        
+        # Exactly one colon means host:port; IPv6 addresses have several
+        has_port = host.count(':') == 1 and host.rsplit(':', 1)[1].isdigit()
+        if has_port:
+            host = host.rsplit(':', 1)[0]
+        
+        if allowed_ip.is_fqdn:
+            hostnames.append(host)
+            continue
+        
+        try:
+            if '/' in host:
+                networks.append(ipaddress.ip_network(host, strict=False))
+            else:
+                addresses.add(ipaddress.ip_address(host))
+        except ValueError:
+            # An entry with a port may name a host instead of an IP
+            if has_port and '/' not in host:
+                hostnames.append(host)
+    
+    return ClassifiedWhitelist(frozenset(addresses), tuple(networks), tuple(dict.fromkeys(hostnames)))
+
+def invalidate_whitelist(project_id):
+    """Drop cached whitelists for a project after any of its AllowedIP rows change.
+
+    Project-wide entries apply to every environment, so all of the project's keys are cleared.
+    """
+    environment_ids = db.session.execute(
+        db.select(Environment.id).where(Environment.project_id == project_id)
+    ).scalars().all()
+    cache_delete(
+        _cache_key(project_id, None),
+        *[_cache_key(project_id, environment_id) for environment_id in environment_ids]
+    )
+    g.pop('_allowed_ip_lookups', None)
@@ -28,6 +28,51 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # FLASK_ENV=testing makes eager-loaded queries raise on any unplanned lazy load
+    TESTING = os.environ.get('FLASK_ENV') == 'testing'
+    
+    # Connection pool for MySQL/PostgreSQL. pool_pre_ping is off so checkouts don't cost
+    # a SELECT 1 round trip; pool_recycle replaces connections before the server's idle timeout.
+    # pool_timeout makes a request fail fast when the pool is exhausted instead of queueing for 30s.
+    if DATABASE_TYPE.lower() in ('mysql', 'postgresql'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_pre_ping': False,
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 5)),
+        }
+    
+    # Server-side cap on a single statement (milliseconds), so a runaway query can't hold a connection
+    if DATABASE_TYPE.lower() == 'postgresql':
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {
+            'options': f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))}"
+        }
+    
     # Encryption key for secrets
     ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY') or 'generate-a-32-byte-key-for-production'
     
+    # Password key derivation for new backups: 'scrypt' or 'pbkdf2' (settings are stored in each backup)
+    BACKUP_KDF = os.environ.get('BACKUP_KDF', 'scrypt')
+    BACKUP_KDF_ITERATIONS = int(os.environ.get('BACKUP_KDF_ITERATIONS', 600000))
+    
+    # Largest backup upload accepted by /projects/restore, in bytes (applies to that route only)
+    BACKUP_MAX_UPLOAD_SIZE = int(os.environ.get('BACKUP_MAX_UPLOAD_SIZE', 256 * 1024 * 1024))
+    
+    # Redis cache (optional - caching is disabled when REDIS_URL is not set)
+    REDIS_URL = os.environ.get('REDIS_URL')
+    REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 0.5))  # Seconds
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.5))
+    API_TOKEN_CACHE_TTL = int(os.environ.get('API_TOKEN_CACHE_TTL', 60))
+    API_TOKEN_LOCAL_CACHE_TTL = int(os.environ.get('API_TOKEN_LOCAL_CACHE_TTL', 10))
+    API_RESPONSE_CACHE_TTL = int(os.environ.get('API_RESPONSE_CACHE_TTL', 60))
+    API_RESPONSE_STALE_TTL = int(os.environ.get('API_RESPONSE_STALE_TTL', 3600))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    WHITELIST_CACHE_TTL = int(os.environ.get('WHITELIST_CACHE_TTL', 300))
+    DNS_CACHE_TTL = int(os.environ.get('DNS_CACHE_TTL', 60))  # In-process, used for FQDN whitelist entries
+    # Requests per minute per API token on read endpoints; off by default (0), needs Redis
+    API_RATE_LIMIT = int(os.environ.get('API_RATE_LIMIT', 0))
+    
+    # Cache-Control header sent with successful config/secret API responses
+    API_CACHE_CONTROL = os.environ.get('API_CACHE_CONTROL', 'private, max-age=30, stale-while-revalidate=60')
+    
@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+# Gunicorn configuration for ConfigLake
+# Usage: gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+# Every worker must sign sessions with the same key. Without SECRET_KEY each
+# worker would generate its own, and logins would fail depending on which
+# worker answered, so refuse to start instead.
+load_dotenv()
+if not os.environ.get('SECRET_KEY'):
+    raise SystemExit('SECRET_KEY must be set when running under Gunicorn')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# API requests mostly wait on the database and Redis, so threaded workers
+# overlap that I/O. Each worker has its own SQLAlchemy pool; keep
+# DB_POOL_SIZE + DB_MAX_OVERFLOW at or above GUNICORN_THREADS.
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+keepalive = 5
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+accesslog = '-'
+errorlog = '-'
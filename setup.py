@@ -8,6 +8,7 @@ import sys
 import getpass
 from app import create_app, db
 from app.models import User
+from app.utils.upsert import insert_ignore
 
 def init_database():
     """Initialize the database."""
@@ -43,22 +44,20 @@ def create_admin_user():
         print("❌ Password must be at least 8 characters long!")
         return False
     
-    # Check if user already exists
-    existing_user = User.query.filter(
-        (User.username == username) | (User.email == email)
-    ).first()
+    # Create admin user unless the username or email is already taken
+    created = insert_ignore(
+        User,
+        username=username,
+        email=email,
+        password_hash=User.hash_password(password),
+        is_admin=True
+    )
+    db.session.commit()
     
-    if existing_user:
+    if not created:
         print(f"❌ User with username '{username}' or email '{email}' already exists!")
         return False
     
-    # Create admin user
-    admin_user = User(username=username, email=email, is_admin=True)
-    admin_user.set_password(password)
-    
-    db.session.add(admin_user)
-    db.session.commit()
-    
     print(f"Admin user '{username}' created successfully!")
     print(f"📧 Email: {email}")
     print("🔐 You can now login with these credentials")
@@ -21,4 +21,8 @@ with app.app_context():
 "
 
 # Start the application
-python app.py
\ No newline at end of file
+if [ "${FLASK_DEBUG,,}" = "true" ]; then
+    python app.py
+else
+    exec gunicorn -c gunicorn.conf.py 'app:create_app()'
+fi
\ No newline at end of file